@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+UPLOADS_DIR = os.path.join("static", "uploads")
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageAssetCache:
+    """Decoded and resized uploaded images for Image widgets.
+
+    Entries are keyed by (filename, mtime, size, mode) and evicted least
+    recently used first once their decoded pixels exceed max_bytes.
+    """
+
+    def __init__(self, uploads_dir=UPLOADS_DIR, max_bytes=32 * 1024 * 1024):
+        self.uploads_dir = uploads_dir
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, filename):
+        return os.path.join(self.uploads_dir, filename)
+
+    def get(self, filename, size, mode=None):
+        """Return the uploaded image resized to size (and converted to mode if given).
+
+        The returned image is shared, callers must not modify it.
+        """
+        path = self.path(filename)
+        key = (filename, os.stat(path).st_mtime_ns, tuple(size), mode)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        with Image.open(path) as src:
+            image = src.resize(tuple(size))
+        if mode is not None and image.mode != mode:
+            image = image.convert(mode)
+
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = image
+                self._bytes += _image_bytes(image)
+            while len(self._images) > 1 and self._bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= _image_bytes(evicted)
+        return image
+
+    def invalidate(self, filename):
+        """Drop every cached variant of an uploaded file (after re-upload or delete)."""
+        with self._lock:
+            for key in [k for k in self._images if k[0] == filename]:
+                self._bytes -= _image_bytes(self._images.pop(key))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._images), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+ASSET_CACHE = ImageAssetCache()
@@ -0,0 +1,75 @@
+"""Compression ratio and encode time of the frame transfer encodings.
+
+Renders a small corpus of synthetic screens for every display profile in
+data/displays.json and compares the run-length codec with zlib as a reference.
+
+Run from the backend directory:
+    python benchmarks/bench_codec.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import zlib
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+import display as dsp
+import frame_codec
+
+FONT = "Montserrat"
+
+
+def corpus(width, height):
+    """Screens like the ones people build: a clock, a departure board, a sensor dashboard."""
+    departures = {
+        f"{i}. row": {"departure_time": f"10:{i:02}", "direction": "Hlavní nádraží", "number": str(i), "type": "Tram"}
+        for i in range(1, 6)
+    }
+    return {
+        "clock": [
+            {"type": "ValueText", "value": "12:34", "x": width // 8, "y": height // 4, "fontSize": height // 3, "fontFamily": FONT},
+            {"type": "StaticText", "text": "Monday 18/10", "x": 4, "y": 4, "fontSize": 16, "fontFamily": FONT},
+        ],
+        "departures": [
+            {"type": "StaticText", "text": "Česká", "x": 4, "y": 0, "fontSize": 18, "fontFamily": FONT, "isBold": True},
+            {"type": "ValueText", "value": departures, "x": 4, "y": 24, "fontSize": 12, "fontFamily": FONT},
+        ],
+        "dashboard": [
+            {"type": "StaticText", "text": "Living room", "x": 4, "y": 4, "fontSize": 20, "fontFamily": FONT},
+            {"type": "ValueText", "value": 21.46, "decimals": 1, "unit": "°C", "x": 4, "y": 40, "fontSize": 36, "fontFamily": FONT},
+            {"type": "ProgressBar", "value": 64, "x": 4, "y": height - 30, "width": width - 8, "height": 20, "color": "black", "fontFamily": FONT},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    with open("data/displays.json", encoding="utf-8") as f:
+        displays = json.load(f)
+
+    print(f"{'display':<28} {'screen':<11} {'raw B':>8} {'rle B':>8} {'ratio':>6} {'rle ms':>7} {'zlib B':>8} {'zlib ms':>8}")
+    for display in displays:
+        width, height = display["resolutionX"], display["resolutionY"]
+        for name, widgets in corpus(width, height).items():
+            screen = {"id": 0, "resolutionX": width, "resolutionY": height, "widgets": widgets}
+            frame = dsp.render_screen_bin(screen, display)
+
+            encoded = frame_codec.rle_encode(frame)
+            if frame_codec.rle_decode(encoded) != frame:
+                raise SystemExit(f"[BENCH] rle round-trip failed for {name} on {display['name']}")
+            t_rle = min(timeit.repeat(lambda: frame_codec.rle_encode(frame), number=1, repeat=args.repeat))
+            zipped = zlib.compress(frame, 9)
+            t_zlib = min(timeit.repeat(lambda: zlib.compress(frame, 9), number=1, repeat=args.repeat))
+
+            print(f"{display['name']:<28} {name:<11} {len(frame):>8} {len(encoded):>8} "
+                  f"{len(frame)/len(encoded):>5.1f}x {t_rle*1000:>7.2f} {len(zipped):>8} {t_zlib*1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
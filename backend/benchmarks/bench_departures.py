@@ -0,0 +1,154 @@
+"""Departure queries: per-stop index vs. the original pandas pipeline.
+
+Generates a synthetic GTFS feed, checks that dpmb.get_departures returns the
+same departures as the original filter/merge/sort implementation for a batch
+of random queries, and times both, as well as loading the feed with gtfs_kit
+vs. building and opening the columnar cache.
+
+Run from the backend directory:
+    python benchmarks/bench_departures.py [--stops N] [--trips N] [--queries N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import timeit
+
+import gtfs_kit as gk
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+from datasets.DPMB import dpmb, gtfs_columnar
+from datasets.DPMB.departure_index import format_seconds
+import synthetic_gtfs
+
+
+def legacy_get_departures(feed, stop_name, direction_id=None, platform_code=None, current_secs=0,
+                          line_number=None, limit=10, service_date=None):
+    """The original get_departures pipeline for one service day, kept as reference.
+
+    Sorts stably so departures at the same second come out in feed order
+    like the index returns them (the original quicksort left ties unordered).
+    """
+    stops = feed.stops
+    if platform_code:
+        stop_ids = stops[
+            (stops['stop_name'] == stop_name) &
+            (stops['platform_code'].astype(str) == str(platform_code))
+        ]['stop_id'].unique()
+    else:
+        stop_ids = stops[stops['stop_name'] == stop_name]['stop_id'].unique()
+    if len(stop_ids) == 0:
+        raise RuntimeError("No stop IDs found")
+
+    active_service_ids = feed.get_active_services(date=service_date)
+
+    st = feed.stop_times[feed.stop_times['stop_id'].isin(stop_ids)]
+    trips_today = feed.trips[feed.trips['service_id'].isin(active_service_ids)]
+    st = st[st['trip_id'].isin(trips_today['trip_id'])]
+    st = st[st["departure_time"].apply(dpmb.time_to_seconds) >= current_secs]
+    merged = st.merge(feed.trips, on='trip_id').merge(feed.routes, on='route_id')
+
+    if direction_id is not None:
+        merged = merged[merged["direction_id"] == int(direction_id)]
+
+    def extract_line_number(route_id):
+        match = re.search(r"L(\d+)D", str(route_id))
+        return match.group(1) if match else ""
+
+    merged["line_number"] = merged["route_id"].apply(extract_line_number)
+    merged["vehicle_type"] = merged["route_type"].apply(lambda x: dpmb.ROUTE_TYPE_MAP.get(x, "Unknown"))
+    if line_number:
+        merged = merged[merged["line_number"] == str(line_number)]
+
+    merged['departure_timedelta'] = pd.to_timedelta(merged['departure_time'])
+    result = merged.sort_values('departure_timedelta', kind="stable")[
+        ['departure_time', 'trip_headsign', 'line_number', 'vehicle_type']]
+    return result.head(limit).to_dict(orient="records")
+
+
+def reference_departures(feed, current_time_str, current_date, limit=10, **query):
+    """The original pipeline run for yesterday's, today's and tomorrow's service day, merged by time."""
+    current_secs = dpmb.time_to_seconds(current_time_str)
+    merged = []
+    for rank, (date, offset) in enumerate(dpmb.ServiceCalendar(None).service_days(current_date)):
+        records = legacy_get_departures(feed, current_secs=current_secs - offset, limit=None,
+                                        service_date=date, **query)
+        for i, record in enumerate(records):
+            secs = dpmb.time_to_seconds(record["departure_time"]) + offset
+            merged.append((secs, rank, i, {**record, "departure_time": format_seconds(secs)}))
+    merged.sort(key=lambda item: item[:3])
+    return [record for *_, record in merged[:limit]]
+
+
+# Thursday to Monday, so the weekday/weekend services change under the queries
+DATES = ["20261015", "20261016", "20261017", "20261018", "20261019"]
+
+
+def random_queries(n, n_stops, n_routes, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        secs = rng.choice([rng.randint(0, 2 * 3600), rng.randint(0, 24 * 3600 - 1)])
+        queries.append(dict(
+            stop_name=synthetic_gtfs.stop_name(rng.randrange(n_stops)),
+            direction_id=rng.choice([None, 0, 1]),
+            platform_code=rng.choice([None, "1", "2"]),
+            current_time_str=f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}",
+            line_number=rng.choice([None, None, str(rng.randint(1, n_routes))]),
+            limit=rng.choice([1, 5, 10, 40]),
+            current_date=rng.choice(DATES),
+        ))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stops", type=int, default=200)
+    parser.add_argument("--routes", type=int, default=20)
+    parser.add_argument("--trips", type=int, default=60, help="trips per route")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = dpmb.GTFS_ZIP_PATH = synthetic_gtfs.write_zip(
+            os.path.join(tmp, "gtfs.zip"), n_stops=args.stops, n_routes=args.routes, trips_per_route=args.trips)
+        queries = random_queries(args.queries, args.stops, args.routes)
+        gk_feed = gk.read_feed(path, dist_units="km")
+
+        for query in queries:
+            if dpmb.get_departures(**query) != reference_departures(gk_feed, **query):
+                raise SystemExit(f"[BENCH] Results differ for {query}")
+        print(f"{len(queries)} random queries return the same departures as the pandas pipeline "
+              f"over yesterday's, today's and tomorrow's service")
+
+        sha256 = "0" * 64
+        cache_dir = os.path.join(tmp, "bench-cache")
+        t_read_feed = min(timeit.repeat(lambda: gk.read_feed(path, dist_units="km"), number=1, repeat=args.repeat))
+        t_convert = min(timeit.repeat(lambda: gtfs_columnar.build(path, sha256, cache_dir), number=1, repeat=args.repeat))
+        t_open = min(timeit.repeat(lambda: gtfs_columnar.load(path, sha256, cache_dir), number=1, repeat=args.repeat))
+        feed = gtfs_columnar.load(path, sha256, cache_dir)
+        today = DATES[0]
+        t_build = min(timeit.repeat(
+            lambda: dpmb.DepartureIndex(feed, feed.active_services(today), dpmb.ROUTE_TYPE_MAP, dpmb.LINE_NUMBER_PATTERN),
+            number=1, repeat=args.repeat))
+        t_legacy = min(timeit.repeat(lambda: [reference_departures(gk_feed, **q) for q in queries],
+                                     number=1, repeat=args.repeat)) / len(queries)
+        t_index = min(timeit.repeat(lambda: [dpmb.get_departures(**q) for q in queries],
+                                    number=1, repeat=args.repeat)) / len(queries)
+
+        print(f"gtfs_kit.read_feed:                  {t_read_feed*1000:9.2f} ms")
+        print(f"columnar cache build (once per zip): {t_convert*1000:9.2f} ms")
+        print(f"columnar cache open:                 {t_open*1000:9.2f} ms")
+        print(f"index build (once per feed and day): {t_build*1000:9.2f} ms")
+        print(f"pandas pipeline x3 days per query:   {t_legacy*1000:9.3f} ms")
+        print(f"index lookup per query:              {t_index*1000:9.3f} ms  ({t_legacy/t_index:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Refresh fan-out cost: binding index vs. walking every widget of every screen.
+
+Builds synthetic screens in a temporary store and times how long it takes to
+push one source's new values into the widgets bound to it.
+
+Run from the backend directory:
+    python benchmarks/bench_fanout.py [--screens N] [--widgets N] [--sources N]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+import controller
+from state_store import JsonStore
+
+FIELDS = ["time", "date", "tempC", "desc"]
+
+
+class FakeSource:
+    def __init__(self, value):
+        self.value = value
+
+    def get_data(self):
+        return {field: {"value": f"{field}-{self.value}", "type": "string"} for field in FIELDS}
+
+
+def make_screens(n_screens, n_widgets, n_sources, seed=0):
+    rng = random.Random(seed)
+    screens = []
+    for screen_id in range(1, n_screens + 1):
+        widgets = []
+        for _ in range(n_widgets):
+            if rng.random() < 0.5:
+                widgets.append({"type": "StaticText", "text": "label", "x": 0, "y": 0})
+            else:
+                widgets.append({"type": "ValueText", "sourceUid": rng.randint(1, n_sources),
+                                "fieldName": rng.choice(FIELDS), "value": "", "x": 0, "y": 0})
+        screens.append({"id": screen_id, "resolutionX": 122, "resolutionY": 250, "widgets": widgets})
+    return screens
+
+
+def legacy_fanout(screens, uid, instance):
+    """The per-tick walk the controller used before the binding index."""
+    patched = 0
+    for screen in screens:
+        changed = False
+        for widget in screen.get("widgets", []):
+            if widget.get("sourceUid") == uid:
+                field = widget.get("fieldName")
+                if field and field in instance.get_data():
+                    widget["value"] = instance.get_data()[field]["value"]
+                    changed = True
+        patched += changed
+    return patched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--screens", type=int, default=1000)
+    parser.add_argument("--widgets", type=int, default=20, help="widgets per screen")
+    parser.add_argument("--sources", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    screens = make_screens(args.screens, args.widgets, args.sources)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Point the controller at a throwaway store, writes go to the temp dir
+        controller.SCREENS = JsonStore(os.path.join(tmp, "screens.json"), key="id", delay=3600)
+        for screen in make_screens(args.screens, args.widgets, args.sources):
+            controller.SCREENS.put(screen)
+        controller.BINDINGS.rebuild(controller.SCREENS.all())
+
+        instance = FakeSource(1)
+        t_legacy = min(timeit.repeat(lambda: legacy_fanout(screens, 1, instance), number=1, repeat=args.repeat))
+        t_index = min(timeit.repeat(lambda: controller._apply_source_to_screens(1, instance), number=1, repeat=args.repeat))
+        bound = sum(len(w) for w in controller.BINDINGS.bindings(1).values())
+
+        print(f"{args.screens} screens x {args.widgets} widgets, {args.sources} sources, "
+              f"{bound} widgets bound to the refreshed source")
+        path = os.path.join(tmp, "legacy.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(screens, f, ensure_ascii=False, indent=4)
+
+        def legacy_with_json():
+            # What a refresh cost before: load screens.json, walk, write it back
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            legacy_fanout(loaded, 1, instance)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(loaded, f, ensure_ascii=False, indent=4)
+        t_legacy_json = min(timeit.repeat(legacy_with_json, number=1, repeat=args.repeat))
+
+        print(f"walk all widgets + JSON round trip: {t_legacy_json*1000:8.2f} ms")
+        print(f"walk all widgets:                   {t_legacy*1000:8.2f} ms")
+        print(f"binding index:                      {t_index*1000:8.2f} ms")
+        controller.SCREENS.flush()
+
+
+if __name__ == "__main__":
+    main()
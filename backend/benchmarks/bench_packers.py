@@ -0,0 +1,118 @@
+"""Micro-benchmark for the framebuffer packers in display.py.
+
+Compares the NumPy packers with the original per-pixel loops they replaced
+and checks that both produce identical bytes (including odd widths).
+
+Run from the backend directory:
+    python benchmarks/bench_packers.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import display as dsp
+
+# (width, height) of panels we care about: LaskaKit 2.13", LilyGO T5-4.7, 9.7" and 10.3" panels
+PANEL_SIZES = [(122, 250), (960, 540), (1200, 825), (1872, 1404)]
+# Odd widths/heights are only checked for identical output, not timed
+ODD_SIZES = [(121, 250), (7, 3), (961, 541)]
+
+
+def legacy_pack_1bpp(image, width, height):
+    """The original convert_image_to_1bpp_bin loop, kept as reference."""
+    image = image.convert('L')
+    image = image.resize((width, height), resample=Image.NEAREST)
+    image = image.point(lambda p: 255 if p > 128 else 0, mode='1')
+    pixels = np.array(image, dtype=np.uint8)
+
+    byte_array = bytearray()
+    bytes_per_row = (width + 7) // 8
+    for y in range(height):
+        byte = 0
+        bit_count = 0
+        for x in range(width):
+            byte = (byte << 1) | pixels[y, x]
+            bit_count += 1
+            if bit_count == 8:
+                byte_array.append(byte)
+                byte = 0
+                bit_count = 0
+        if bit_count > 0:
+            byte = byte << (8 - bit_count)
+            byte_array.append(byte)
+        while len(byte_array) % bytes_per_row != 0:
+            byte_array.append(0x00)
+    return bytes(byte_array)
+
+
+def legacy_pack_4bpp(image, width, height):
+    """The original convert_image_to_4bpp_bin loop, kept as reference."""
+    image = image.convert('L')
+    image = image.resize((width, height), resample=Image.NEAREST)
+
+    out = bytearray()
+    for y in range(0, height):
+        byte = 0
+        done = True
+        for x in range(0, width):
+            l = image.getpixel((x, y))
+            if x % 2 == 0:
+                byte = l >> 4
+                done = False
+            else:
+                byte |= l & 0xF0
+                out += byte.to_bytes(1, 'big')
+                done = True
+        if not done:
+            out += byte.to_bytes(1, 'big')
+    return bytes(out)
+
+
+def make_test_image(width, height, seed=0):
+    """Mostly white noise image with some dark blocks, like a rendered screen."""
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+    arr[height // 4: height // 2, width // 4: width // 2] = 0
+    return Image.fromarray(arr, mode='L').convert('RGB')
+
+
+def bench(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    cases = [
+        ("1bpp", legacy_pack_1bpp, dsp.pack_1bpp),
+        ("4bpp", legacy_pack_4bpp, dsp.pack_4bpp),
+    ]
+
+    for name, legacy, fast in cases:
+        for width, height in ODD_SIZES:
+            image = make_test_image(width, height)
+            if legacy(image, width, height) != fast(image, width, height):
+                raise SystemExit(f"[BENCH] {name} output differs at {width}x{height}")
+
+    print(f"{'packer':<6} {'size':>11} {'legacy ms':>11} {'numpy ms':>10} {'speedup':>9}")
+    for name, legacy, fast in cases:
+        for width, height in PANEL_SIZES:
+            image = make_test_image(width, height)
+            if legacy(image, width, height) != fast(image, width, height):
+                raise SystemExit(f"[BENCH] {name} output differs at {width}x{height}")
+
+            t_legacy = bench(lambda: legacy(image, width, height), args.repeat)
+            t_fast = bench(lambda: fast(image, width, height), args.repeat)
+            print(f"{name:<6} {f'{width}x{height}':>11} {t_legacy*1000:>11.2f} "
+                  f"{t_fast*1000:>10.3f} {t_legacy/t_fast:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
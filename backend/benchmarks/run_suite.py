@@ -0,0 +1,247 @@
+"""Offline benchmark suite with JSON output, for comparing commits.
+
+Covers render_display, the packers for every profile in data/displays.json,
+transform_image, dpmb.get_departures on a synthetic GTFS feed and the
+controller refresh fan-out. Nothing touches the network or the real data
+files.
+
+Run from the backend directory:
+    python benchmarks/run_suite.py [--repeat N] [--only NAME ...] [--output results.json]
+    python benchmarks/run_suite.py --compare before.json after.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np
+from PIL import Image
+
+import controller
+import display as dsp
+from asset_cache import ImageAssetCache
+from state_store import JsonStore
+from datasets.DPMB import dpmb, gtfs_columnar
+import bench_fanout
+import synthetic_gtfs
+
+FONT = "Montserrat"
+
+
+def measure(func, repeat):
+    """Time func() repeat times, its own prints are swallowed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()  # warm-up, fills font/asset caches like a running server
+        times = timeit.repeat(func, number=1, repeat=repeat)
+    return {
+        "min_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "mean_ms": round(statistics.fmean(times) * 1000, 4),
+        "repeat": repeat,
+    }
+
+
+def load_displays():
+    with open("data/displays.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_screen(width, height, n, image=None):
+    """Screen with n widgets of each kind: StaticText, ValueText, table and (if given) Image."""
+    departures = {
+        f"{i}. row": {"departure_time": f"10:{i:02}", "direction": "Hlavní nádraží", "number": str(i), "type": "Tram"}
+        for i in range(1, 6)
+    }
+    widgets = []
+    for i in range(n):
+        x, y = (i * 37) % max(width - 60, 1), (i * 53) % max(height - 40, 1)
+        widgets.append({"type": "StaticText", "text": f"Label {i}", "x": x, "y": y, "fontSize": 14, "fontFamily": FONT})
+        widgets.append({"type": "ValueText", "value": 21.5 + i, "decimals": 1, "unit": "°C",
+                        "x": x, "y": y + 16, "fontSize": 18, "fontFamily": FONT})
+        widgets.append({"type": "ValueText", "value": departures, "x": x, "y": y, "fontSize": 10, "fontFamily": FONT})
+        if image:
+            widgets.append({"type": "Image", "filename": image, "x": x, "y": y,
+                            "width": min(64, width), "height": min(64, height), "fontFamily": FONT})
+    return {"id": 0, "resolutionX": width, "resolutionY": height, "widgets": widgets}
+
+
+def make_test_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+    return Image.fromarray(arr, mode="L").convert("RGB")
+
+
+def bench_render(args, tmp):
+    # Image widgets read from a throwaway uploads directory
+    uploads = os.path.join(tmp, "uploads")
+    os.makedirs(uploads)
+    make_test_image(200, 200).save(os.path.join(uploads, "photo.png"))
+    dsp.ASSET_CACHE = ImageAssetCache(uploads_dir=uploads)
+
+    results = {}
+    for display in load_displays():
+        width, height = display["resolutionX"], display["resolutionY"]
+        for n in args.widgets:
+            screen = synthetic_screen(width, height, n, image="photo.png")
+            results[f"render_display/{display['type']}/{width}x{height}/n={n}"] = measure(
+                lambda: dsp.render_display(screen, levels=dsp.PACKER_LEVELS[display["type"]]), args.repeat)
+    return results
+
+
+def bench_packers(args, tmp):
+    converters = {"1bpp": dsp.convert_image_to_1bpp_bin, "4bpp": dsp.convert_image_to_4bpp_bin}
+    results = {}
+    for display in load_displays():
+        width, height = display["resolutionX"], display["resolutionY"]
+        buf = io.BytesIO()
+        make_test_image(width, height).save(buf, format="PNG")
+        png = buf.getvalue()
+        for name, convert in converters.items():
+            results[f"convert_image_to_{name}_bin/{width}x{height}"] = measure(
+                lambda: convert(io.BytesIO(png), None, width, height), args.repeat)
+    return results
+
+
+def bench_transform(args, tmp):
+    results = {}
+    for display in load_displays():
+        width, height = display["resolutionX"], display["resolutionY"]
+        buf = io.BytesIO()
+        make_test_image(width, height).save(buf, format="PNG")
+        png = buf.getvalue()
+        for rotated, flip in ((False, False), (True, True)):
+            results[f"transform_image/{width}x{height}/rotated={rotated},flip={flip}"] = measure(
+                lambda: dsp.transform_image(png, rotated, flip, flip), args.repeat)
+    return results
+
+
+# Fixed service day (a Thursday), so the active services and the work done don't depend on when the suite runs
+GTFS_DATE = "20261015"
+
+
+def bench_gtfs(args, tmp):
+    path = synthetic_gtfs.write_zip(os.path.join(tmp, "gtfs.zip"), n_stops=args.gtfs_stops,
+                                    trips_per_route=args.gtfs_trips)
+    dpmb.GTFS_ZIP_PATH = path
+    stop = synthetic_gtfs.stop_name(5)
+    queries = {
+        "stop": dict(stop_name=stop, current_time_str="12:00:00"),
+        "stop+platform+direction": dict(stop_name=stop, platform_code="2", direction_id=1, current_time_str="12:00:00"),
+        "stop+line": dict(stop_name=stop, line_number="3", current_time_str="07:00:00"),
+    }
+    results = {f"get_departures/{name}": measure(lambda: dpmb.get_departures(current_date=GTFS_DATE, **kwargs), args.repeat)
+               for name, kwargs in queries.items()}
+    boards = [dict(stop_name=synthetic_gtfs.stop_name(i), limit=5) for i in range(20)]
+    results["get_departures/20 boards one by one"] = measure(
+        lambda: [dpmb.get_departures(current_time_str="12:00:00", current_date=GTFS_DATE, **board) for board in boards],
+        args.repeat)
+    results["get_departures_batch/20 boards"] = measure(
+        lambda: dpmb.get_departures_batch(boards, current_time_str="12:00:00", current_date=GTFS_DATE), args.repeat)
+    cache_dir = os.path.join(tmp, "columnar-bench")
+    results["gtfs_columnar/build"] = measure(lambda: gtfs_columnar.build(path, "0" * 64, cache_dir), args.repeat)
+    results["gtfs_columnar/open"] = measure(lambda: gtfs_columnar.load(path, "0" * 64, cache_dir), args.repeat)
+    return results
+
+
+def bench_fanout_case(args, tmp):
+    store = JsonStore(os.path.join(tmp, "screens.json"), key="id", delay=3600)
+    for screen in bench_fanout.make_screens(args.screens, 20, 50):
+        store.put(screen)
+    controller.SCREENS = store
+    controller.BINDINGS.rebuild(store.all())
+    instance = bench_fanout.FakeSource(1)
+    result = {f"fanout/screens={args.screens}": measure(
+        lambda: controller._apply_source_to_screens(1, instance), args.repeat)}
+    store.flush()
+    return result
+
+
+CASES = {
+    "render": bench_render,
+    "packers": bench_packers,
+    "transform": bench_transform,
+    "gtfs": bench_gtfs,
+    "fanout": bench_fanout_case,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)["results"]
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)["results"]
+    print(f"{'benchmark':<60} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for name in sorted(set(before) & set(after)):
+        b, a = before[name]["median_ms"], after[name]["median_ms"]
+        print(f"{name:<60} {b:>10.3f} {a:>10.3f} {(a - b) / b * 100 if b else 0:>+7.1f}%")
+    for name in sorted(set(before) ^ set(after)):
+        print(f"{name:<60} only in {'before' if name in before else 'after'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="run only these groups")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--widgets", type=int, nargs="+", default=[1, 5, 20], help="widgets of each kind per screen")
+    parser.add_argument("--screens", type=int, default=1000, help="screens for the fan-out benchmark")
+    parser.add_argument("--gtfs-stops", type=int, default=200)
+    parser.add_argument("--gtfs-trips", type=int, default=60, help="trips per route")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or CASES:
+            print(f"[BENCH] {name}", file=sys.stderr)
+            case_tmp = os.path.join(tmp, name)
+            os.makedirs(case_tmp)
+            results.update(CASES[name](args, case_tmp))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
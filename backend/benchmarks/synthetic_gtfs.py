@@ -0,0 +1,82 @@
+"""Generator of a synthetic GTFS feed shaped like the DPMB one.
+
+Used by the benchmarks so GTFS queries can be measured offline and
+reproducibly. Route ids follow the DPMB "L<line>D<n>" pattern that
+dpmb.get_departures extracts line numbers from.
+"""
+import csv
+import io
+import random
+import zipfile
+
+ROUTE_TYPES = [0, 3, 800]  # tram, bus, trolleybus
+SERVICES = {
+    # service_id: monday..sunday
+    "workday": [1, 1, 1, 1, 1, 0, 0],
+    "weekend": [0, 0, 0, 0, 0, 1, 1],
+    "daily": [1, 1, 1, 1, 1, 1, 1],
+}
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def _table(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def stop_name(i):
+    return f"Stop {i:04d}"
+
+
+def build_feed(n_stops=200, n_routes=20, trips_per_route=60, stops_per_trip=20, seed=0):
+    """Return {filename: csv text} of a synthetic feed.
+
+    Every stop has two platforms ("1" and "2", one per direction). Trips run
+    from 04:30 until past midnight, so some departures are later than 24:00:00.
+    """
+    rng = random.Random(seed)
+    stops = []
+    for i in range(n_stops):
+        for platform in ("1", "2"):
+            stops.append([f"U{i}Z{platform}", stop_name(i), platform,
+                          f"{49.1 + rng.random() / 10:.6f}", f"{16.5 + rng.random() / 10:.6f}"])
+
+    routes, trips, stop_times = [], [], []
+    for r in range(1, n_routes + 1):
+        route_id = f"L{r}D1"
+        routes.append([route_id, "dpmb", str(r), ROUTE_TYPES[r % len(ROUTE_TYPES)]])
+        path = rng.sample(range(n_stops), min(stops_per_trip, n_stops))
+        headway = (20 * 3600) // trips_per_route
+        for t in range(trips_per_route):
+            direction = t % 2
+            ordered = path if direction == 0 else path[::-1]
+            service = rng.choice(list(SERVICES))
+            trip_id = f"{route_id}_{t}"
+            trips.append([route_id, service, trip_id, stop_name(ordered[-1]), direction])
+            secs = 4 * 3600 + 1800 + t * headway + rng.randint(0, 120)
+            for seq, stop in enumerate(ordered):
+                hhmmss = f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+                stop_times.append([trip_id, hhmmss, hhmmss, f"U{stop}Z{direction + 1}", seq + 1])
+                secs += rng.randint(60, 180)
+
+    calendar = [[sid] + days + ["20200101", "20991231"] for sid, days in SERVICES.items()]
+    return {
+        "agency.txt": _table(["agency_id", "agency_name", "agency_url", "agency_timezone"],
+                             [["dpmb", "Synthetic", "https://example.com", "Europe/Prague"]]),
+        "stops.txt": _table(["stop_id", "stop_name", "platform_code", "stop_lat", "stop_lon"], stops),
+        "routes.txt": _table(["route_id", "agency_id", "route_short_name", "route_type"], routes),
+        "trips.txt": _table(["route_id", "service_id", "trip_id", "trip_headsign", "direction_id"], trips),
+        "stop_times.txt": _table(["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"], stop_times),
+        "calendar.txt": _table(["service_id"] + DAYS + ["start_date", "end_date"], calendar),
+    }
+
+
+def write_zip(path, **kwargs):
+    """Write a synthetic feed (see build_feed for the parameters) to a zip file."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, text in build_feed(**kwargs).items():
+            zf.writestr(name, text)
+    return path
@@ -0,0 +1,62 @@
+import threading
+
+
+class BindingIndex:
+    """Reverse index from datasource uid to the widgets bound to it.
+
+    Each binding is (screen id, widget index, fieldName). Screens are
+    re-indexed whenever their widget list is saved, so refreshing a source
+    only touches the widgets that actually show it.
+    """
+
+    def __init__(self):
+        self._by_source = {}  # uid -> {screen id -> [(widget index, fieldName)]}
+        self._by_screen = {}  # screen id -> set of uids, to drop old bindings on re-index
+        self._lock = threading.Lock()
+
+    def rebuild(self, screens):
+        with self._lock:
+            self._by_source.clear()
+            self._by_screen.clear()
+            for screen in screens:
+                self._add(screen)
+
+    def index_screen(self, screen):
+        with self._lock:
+            self._remove(screen.get("id"))
+            self._add(screen)
+
+    def remove_screen(self, screen_id):
+        with self._lock:
+            self._remove(screen_id)
+
+    def remove_source(self, uid):
+        with self._lock:
+            for screen_id in self._by_source.pop(uid, {}):
+                self._by_screen.get(screen_id, set()).discard(uid)
+
+    def bindings(self, uid):
+        """Return {screen id: [(widget index, fieldName)]} for a source."""
+        with self._lock:
+            return {screen_id: list(widgets) for screen_id, widgets in self._by_source.get(uid, {}).items()}
+
+    def count(self):
+        with self._lock:
+            return sum(len(w) for screens in self._by_source.values() for w in screens.values())
+
+    def _add(self, screen):
+        screen_id = screen.get("id")
+        for i, widget in enumerate(screen.get("widgets", [])):
+            uid, field = widget.get("sourceUid"), widget.get("fieldName")
+            if uid is None or not field:
+                continue
+            self._by_source.setdefault(uid, {}).setdefault(screen_id, []).append((i, field))
+            self._by_screen.setdefault(screen_id, set()).add(uid)
+
+    def _remove(self, screen_id):
+        for uid in self._by_screen.pop(screen_id, ()):
+            screens = self._by_source.get(uid)
+            if screens is not None:
+                screens.pop(screen_id, None)
+                if not screens:
+                    del self._by_source[uid]
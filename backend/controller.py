@@ -5,6 +5,12 @@ from datasets.DPMB.dpmb_source import DPMBSource
 from datasets.datasource_base import DataSource
 from datasets.MQTT.mqtt_source import MQTTSource
 from datasets.Time.time_source import TimeDataSource
+from state_store import JsonStore
+from binding_index import BindingIndex
+from fetch_executor import FetchExecutor, FetchResult
+from concurrent.futures import ThreadPoolExecutor
+from refresh_scheduler import RefreshScheduler
+from metrics import FETCH_DURATION, FETCH_ERRORS, REFRESH_TICK_DURATION
 import threading
 import time
 import datetime
@@ -18,6 +24,18 @@ DISPLAYS_PATH = 'data/displays.json'
 # In-memory instance registry
 INSTANCE_REGISTRY = {}
 
+# Callbacks called with the list of screens whose widgets changed (e.g. pre-rendering)
+SCREEN_UPDATE_LISTENERS = []
+
+def _notify_screens_updated(screens):
+    if not screens:
+        return
+    for listener in SCREEN_UPDATE_LISTENERS:
+        try:
+            listener(screens)
+        except Exception as e:
+            print(f"[Screens] Update listener failed: {e}")
+
 SOURCE_CLASSES = {
     "Weather-OPEN_WEATHER": OpenWeatherSource,
     "DPMB-departures from stop for Brno": DPMBSource,
@@ -26,10 +44,10 @@ SOURCE_CLASSES = {
 }
 
 def get_all_screens():
-    return load_json(SCREENS_PATH)
+    return SCREENS.all()
 
 def get_all_displays():
-    return load_json(DISPLAYS_PATH)
+    return DISPLAYS.all()
 
 def log(*args, filename="log.txt"):
     timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
@@ -38,56 +56,41 @@ def log(*args, filename="log.txt"):
         f.write(f"{timestamp} {message}\n")
 
 def get_screen_by_id(screen_id):
-    screens = load_json(SCREENS_PATH)
-    for screen in screens:
-        if screen.get("id") == screen_id:
-            return screen
-    raise ValueError(f"Display with ID {screen_id} not found")
+    screen = SCREENS.get(screen_id)
+    if screen is None:
+        raise ValueError(f"Display with ID {screen_id} not found")
+    return screen
 
 def get_display_by_id(display_id):
-    displays = load_json(DISPLAYS_PATH)
-    for display in displays:
-        if display.get("id") == display_id:
-            return display
-    raise ValueError(f"Display with ID {display_id} not found")
+    display = DISPLAYS.get(display_id)
+    if display is None:
+        raise ValueError(f"Display with ID {display_id} not found")
+    return display
 
 
 def save_screen(screen_data):
-    screens = load_json(SCREENS_PATH)
-    if not isinstance(screens, list):
-        screens = []
-
-    if not screen_data["id"]:
-        existing_ids = {d.get("id") for d in screens if "id" in d}
-        new_id = 1
-        while new_id in existing_ids:
-            new_id += 1
-        screen_data["id"] = new_id
-
-    screens.append(screen_data)
-    save_json(SCREENS_PATH, screens)
+    with SCREENS.transaction():
+        if not screen_data["id"]:
+            screen_data["id"] = SCREENS.next_id()
+        SCREENS.put(screen_data)
+        BINDINGS.index_screen(screen_data)
     return screen_data
 
 def delete_screen(screen_id):
-    screens = load_json(SCREENS_PATH)
-    filtered = [s for s in screens if s.get("id") != screen_id]
-    save_json(SCREENS_PATH, filtered)
+    with SCREENS.transaction():
+        SCREENS.delete(screen_id)
+        BINDINGS.remove_screen(screen_id)
 
 def update_screen(screen_id, new_data):
-    screens = load_json(SCREENS_PATH)
-    updated = False
-
-    for i, d in enumerate(screens):
-        if d.get("id") == screen_id:
-            screens[i].update(new_data)
-            updated = True
-            break
-
-    if not updated:
+    try:
+        with SCREENS.transaction():
+            screen = SCREENS.update(screen_id, new_data)
+            BINDINGS.index_screen(screen)
+    except KeyError:
         raise ValueError(f"Display with ID {screen_id} not found")
 
-    save_json(SCREENS_PATH, screens)
-    return screens[i]
+    _notify_screens_updated([screen])
+    return screen
 
 
 def load_json(path):
@@ -96,9 +99,14 @@ def load_json(path):
             return json.load(f)
     return {}
 
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+# In-memory state, written back to the JSON files in the background
+SCREENS = JsonStore(SCREENS_PATH, key="id")
+DISPLAYS = JsonStore(DISPLAYS_PATH, key="id")
+DATASOURCES = JsonStore(DATASOURCES_PATH, key="uid", sort=True)
+
+# sourceUid -> widgets bound to it, kept in sync with SCREENS
+BINDINGS = BindingIndex()
+BINDINGS.rebuild(SCREENS.all())
 
 def get_all_data_sets():
     return load_json(DATASETS_PATH)
@@ -110,6 +118,30 @@ def create_source_instance(source_name, inputs, uid) -> DataSource:
         raise ValueError(f"No implementation for source: {source_name}")
     return cls(inputs, uid)
 
+def _source_values(instance):
+    return {key: val["value"] for key, val in instance.get_data().items()}
+
+def _apply_source_to_screens(uid, instance):
+    """Copy the instance's current values into every widget bound to uid.
+
+    Returns the screens that changed.
+    """
+    data = instance.get_data()
+    patched = []
+    with SCREENS.transaction():
+        for screen_id, bound in BINDINGS.bindings(uid).items():
+            bound = [(i, field) for i, field in bound if field in data]
+            screen = SCREENS.get(screen_id)
+            if not bound or screen is None:
+                continue
+
+            # Copy only what changes, the rest of the record stays shared
+            widgets = list(screen["widgets"])
+            for i, field in bound:
+                widgets[i] = {**widgets[i], "value": data[field]["value"]}
+            patched.append(SCREENS.put({**screen, "widgets": widgets}))
+    return patched
+
 def save_datasource(source_data):
     try:
         # Validate input
@@ -122,65 +154,56 @@ def save_datasource(source_data):
         if "inputs" not in source_data or not isinstance(source_data["inputs"], dict):
             raise KeyError("Missing or invalid 'inputs' in source_data")
 
-        current_data = load_json(DATASOURCES_PATH)
-        if not isinstance(current_data, list):
-            print("[Warning] datasources.json content is not a list. Initializing empty list.")
-            current_data = []
-
-        # Generate UID
-        existing_ids = {item.get("uid") for item in current_data if "uid" in item}
-        new_uid = 1
-        while new_uid in existing_ids:
-            new_uid += 1
-
-        source_data["uid"] = new_uid
-
-        # Create the instance
-        try:
-            instance = create_source_instance(source_data["source"], source_data["inputs"], new_uid)
-        except Exception as e:
-            print(source_data)
-            raise RuntimeError(f"Failed to create source instance: {e}")
-
-        # Force initial data fetch
-        try:
-            instance.update_data(force=True)
-        except Exception as e:
-            raise RuntimeError(f"Failed to update data for new instance (UID {new_uid}): {e}")
-
-        # Store instance in memory
-        INSTANCE_REGISTRY[new_uid] = instance
+        # Reserve the UID with a placeholder record right away, the first fetch
+        # below can take a while and a concurrent save must not pick the same UID
+        with DATASOURCES.transaction():
+            new_uid = DATASOURCES.next_id()
+            source_data["uid"] = new_uid
+            DATASOURCES.put({**source_data, "data": {}, "name": f"ID:{new_uid} - (saving)"})
 
-        # Store fetched data
         try:
-            source_data["data"] = {
-                key: val["value"] for key, val in instance.get_data().items()
-            }
-        except Exception as e:
-            raise RuntimeError(f"Failed to extract data from instance UID {new_uid}: {e}")
-
-        # Patch displays with this data if needed
-        displays = load_json(SCREENS_PATH)
-        for display in displays:
-            changed = False
-            for widget in display.get("widgets", []):
-                if widget.get("sourceUid") == new_uid:
-                    field = widget.get("fieldName")
-                    if field and field in instance.get_data():
-                        widget["value"] = instance.get_data()[field]["value"]
-                        changed = True
-            if changed:
+            # Create the instance
+            try:
+                instance = create_source_instance(source_data["source"], source_data["inputs"], new_uid)
+            except Exception as e:
+                print(source_data)
+                raise RuntimeError(f"Failed to create source instance: {e}")
+
+            # Force initial data fetch
+            try:
+                instance.update_data(force=True)
+            except Exception as e:
+                raise RuntimeError(f"Failed to update data for new instance (UID {new_uid}): {e}")
+
+            # Store instance in memory
+            INSTANCE_REGISTRY[new_uid] = instance
+            _schedule_next(new_uid, instance)
+            _set_source_state(new_uid, state="ready", name=instance.get_name(), error=None)
+
+            # Store fetched data
+            try:
+                source_data["data"] = _source_values(instance)
+            except Exception as e:
+                raise RuntimeError(f"Failed to extract data from instance UID {new_uid}: {e}")
+
+            # Patch displays with this data if needed. UIDs are reused (editing a source
+            # deletes and re-saves it), so widgets still pointing at this uid are bound again
+            with SCREENS.transaction():
+                BINDINGS.rebuild(SCREENS.all())
+                patched = _apply_source_to_screens(new_uid, instance)
+            for display in patched:
                 print(f"[Save Source] Patched display ID {display.get('id')} with latest values")
+            _notify_screens_updated(patched)
 
-        save_json(SCREENS_PATH, displays)
+            # Add human-friendly name
+            source_data["name"] = f'ID:{new_uid} - {instance.get_name()}'
 
-        # Add human-friendly name
-        source_data["name"] = f'ID:{new_uid} - {instance.get_name()}'
-
-        # Save to file
-        current_data.append(source_data)
-        current_data.sort(key=lambda x: x.get("uid", float("inf")))
-        save_json(DATASOURCES_PATH, current_data)
+            # Save
+            DATASOURCES.put(source_data)
+        except Exception:
+            # Give the UID back, along with anything registered for it so far
+            delete_datasource(new_uid)
+            raise
 
         print(f"[Save Source] Successfully saved source with UID {new_uid}")
         return source_data
@@ -203,40 +226,20 @@ def force_refresh_datasource(uid):
     except Exception as e:
         print(f"[FORCE UPDATE] Failed to update data for UID {uid}: {e}")
         raise RuntimeError(f"Data update failed for UID {uid}: {e}")
+    _schedule_next(uid, instance)
 
     try:
-        all_sources = load_json(DATASOURCES_PATH)
-        if not isinstance(all_sources, list):
-            raise ValueError("datasources.json must contain a list")
-
-        for source in all_sources:
-            if source.get("uid") == uid:
-                # Update the stored data with fresh instance data
-                source["data"] = {
-                    k: v["value"] for k,v in instance.get_data().items()
-                     
-                }
-                break
-        else:
+        if DATASOURCES.get(uid) is None:
             raise ValueError(f"UID {uid} not found in file for updating.")
 
+        # Update the stored data with fresh instance data
+        DATASOURCES.update(uid, {"data": _source_values(instance)})
+
         # Check if this source is used in any display
-        all_displays = load_json(SCREENS_PATH)
-        for display in all_displays:
-            updated_display = False
-            for widget in display.get("widgets", []):
-                if widget.get("sourceUid") == uid:
-                    field = widget.get("fieldName")
-                    if field and field in instance.get_data():
-                        widget["value"] = instance.get_data()[field]["value"]
-                        updated_display = True
-
-            if updated_display:
-                save_json(SCREENS_PATH, all_displays)
-                print(f"[Auto-Refresh] Updated display ID {display.get('id')} due to UID {uid}")
-
-        # Save updated sources
-        save_json(DATASOURCES_PATH, all_sources)
+        patched = _apply_source_to_screens(uid, instance)
+        for display in patched:
+            print(f"[Auto-Refresh] Updated display ID {display.get('id')} due to UID {uid}")
+        _notify_screens_updated(patched)
 
     except Exception as e:
         print(f"[FORCE UPDATE] Failed to update JSON storage for UID {uid}: {e}")
@@ -244,16 +247,13 @@ def force_refresh_datasource(uid):
 
 
 def get_saved_datasources():
-    return load_json(DATASOURCES_PATH)
+    return DATASOURCES.all()
 
 def get_saved_datasource(uid):
-    data = load_json(DATASOURCES_PATH)
-    data = [item for item in data if item.get("uid") == uid]
-    return data
+    source = DATASOURCES.get(uid)
+    return [source] if source is not None else []
 
 def delete_datasource(uid):
-    data = load_json(DATASOURCES_PATH)
-
     # Remove from instance registry and clean up
     if uid in INSTANCE_REGISTRY:
         try:
@@ -261,77 +261,202 @@ def delete_datasource(uid):
             print(f"[Delete] Instance UID {uid} removed from registry and cleaned up.")
         except Exception as e:
             print(f"[Delete] Failed to delete instance UID {uid}: {e}")
+    SCHEDULER.remove(uid)
+    with _source_states_lock:
+        SOURCE_STATES.pop(uid, None)
 
-    # Remove the item with the matching UID from file
-    filtered = [item for item in data if item.get("uid") != uid]
-    save_json(DATASOURCES_PATH, filtered)
+    # Remove the item with the matching UID
+    DATASOURCES.delete(uid)
+    BINDINGS.remove_source(uid)
 
 def get_sleep_display(id):
-    data = load_json(SCREENS_PATH)
-    matching = [item for item in data if item.get("id") == id]
+    screen = SCREENS.get(id)
 
-    if not matching:
+    if screen is None:
         raise ValueError(f"No display found with ID {id}")
 
-    return matching[0].get("refresh")
+    return screen.get("refresh")
 
     
-REFRESH_INTERVAL = 20  # seconds (how often the loop checks)
+RETRY_DELAY = 20  # seconds before a failed fetch is tried again
+
+# uid -> next due time, the refresh loop sleeps until the earliest one
+SCHEDULER = RefreshScheduler()
+
+def _schedule_next(uid, instance):
+    SCHEDULER.schedule_after(uid, instance.last_updated, max(instance.get_update_interval(), 1))
+
+FETCHER = FetchExecutor()
+
+def _commit_source_update(uid, instance):
+    """Store the instance's fresh values and patch the screens bound to it.
+
+    Returns the patched screens.
+    """
+    if DATASOURCES.get(uid) is None:
+        return []
+    DATASOURCES.update(uid, {"data": _source_values(instance)})
+
+    # Check if this source is used in any display
+    patched = _apply_source_to_screens(uid, instance)
+    for display in patched:
+        print(f"[Auto-Refresh] Updated display ID {display.get('id')} due to UID {uid}")
+    return patched
+
+def _record_fetch(uid, instance, result):
+    source = type(instance).__name__ if instance is not None else "unknown"
+    FETCH_DURATION.observe(result.duration, source=source, uid=uid)
+    if result.status != "ok":
+        FETCH_ERRORS.inc(source=source, uid=uid, status=result.status)
+
+def _commit_tick(results):
+    """Apply all fetch results of one tick as a single batch.
+
+    Both stores are held for the whole batch and written at most once at the
+    end, and every affected screen is announced once in its final state.
+    """
+    patched = {}
+    with DATASOURCES.transaction(), SCREENS.transaction():
+        for uid, result in results.items():
+            instance = INSTANCE_REGISTRY.get(uid)
+            _record_fetch(uid, instance, result)
+            if result.status != "ok":
+                print(f"[Auto-Refresh] Failed to update instance {uid} ({result.duration:.2f}s): {result.error}")
+                continue
+            if instance is None:
+                continue
+            try:
+                for screen in _commit_source_update(uid, instance):
+                    patched[screen.get("id")] = screen
+                print(f"[Auto-Refresh] Updated UID {uid} in {result.duration:.2f}s")
+            except Exception as e:
+                print(f"[Auto-Refresh] Failed to store update of instance {uid}: {e}")
+
+    DATASOURCES.flush()
+    SCREENS.flush()
+    _notify_screens_updated(list(patched.values()))
 
 def _auto_refresh_loop():
     while True:
-        time.sleep(REFRESH_INTERVAL)
-        print("[Auto-Refresh] Auto refresh sequence has started")
+        # Sleeps until the next source is due (or the schedule changes)
+        due = SCHEDULER.wait_due()
+        instances = {uid: INSTANCE_REGISTRY[uid] for uid in due if uid in INSTANCE_REGISTRY}
+        if instances:
+            print(f"[Auto-Refresh] Refreshing UIDs {sorted(instances)}")
+        tick_start = time.perf_counter()
         try:
-            all_sources = load_json(DATASOURCES_PATH)
-
-            updated = False
-
-            for uid, instance in INSTANCE_REGISTRY.items():
-                try:
-                    if instance.update_data(force=False):
-                        for source in all_sources:
-                            if source.get("uid") == uid:
-                                source["data"] = {
-                                    k: v["value"] for k,v in instance.get_data().items()
-                                }
-                                updated = True
-                                print(f"[{time.thread_time()}][Auto-Refresh] Updated UID {uid}")
-                                break
-                except Exception as e:
-                    print(f"[Auto-Refresh] Failed to update instance {uid}: {e}")
-
-                if updated:
-                    save_json(DATASOURCES_PATH, all_sources)
-                    # Check if this source is used in any display
-                    all_displays = load_json(SCREENS_PATH)
-                    for display in all_displays:
-                        updated_display = False
-                        for widget in display.get("widgets", []):
-                            if widget.get("sourceUid") == uid:
-                                field = widget.get("fieldName")
-                                if field and field in instance.get_data():
-                                    widget["value"] = instance.get_data()[field]["value"]
-                                    updated_display = True
-
-                        if updated_display:
-                            print(f"[Auto-Refresh] Updated display ID {display.get('id')} due to UID {uid}")
-
-                    save_json(SCREENS_PATH, all_displays)
-
+            # Fetch in parallel, then apply the results in one batch from this thread
+            results = FETCHER.run_due(instances, force=True)
+            if results:
+                _commit_tick(results)
 
         except Exception as global_e:
             print(f"[Auto-Refresh] Global failure: {global_e}")
+        if instances:
+            REFRESH_TICK_DURATION.observe(time.perf_counter() - tick_start)
+
+        # Due sources leave the schedule, put them back for their next run
+        now = time.time()
+        for uid, instance in instances.items():
+            if uid not in INSTANCE_REGISTRY or SCHEDULER.next_due(uid) is not None:
+                continue
+            if now - instance.last_updated < instance.get_update_interval():
+                _schedule_next(uid, instance)
+            else:
+                # Fetch failed, timed out or is still running
+                SCHEDULER.schedule(uid, now + max(min(RETRY_DELAY, instance.get_update_interval()), 1))
+
+
+WARMUP_WORKERS = 4
+
+# uid -> {"state", "name", "error", "duration"} of the startup warm-up
+# state: pending -> initializing -> ready | retrying (first fetch failed) | failed (could not be created)
+SOURCE_STATES = {}
+_source_states_lock = threading.Lock()
+
+def _set_source_state(uid, **fields):
+    with _source_states_lock:
+        SOURCE_STATES.setdefault(uid, {"state": "pending", "name": None, "error": None, "duration": None}).update(fields)
+
+def get_source_states():
+    with _source_states_lock:
+        states = {uid: dict(state) for uid, state in SOURCE_STATES.items()}
+    ready = all(state["state"] not in ("pending", "initializing") for state in states.values())
+    return {"ready": ready, "sources": states}
+
+def _warm_source(item):
+    """Create and fetch one saved source, returns its FetchResult if the fetch succeeded.
+
+    Its values are stored by _warm_sources together with the others.
+    """
+    uid = item["uid"]
+    _set_source_state(uid, state="initializing")
+    start = time.perf_counter()
+    try:
+        instance = create_source_instance(item["source"], item["inputs"], uid)
+    except Exception as e:
+        _set_source_state(uid, state="failed", error=str(e), duration=time.perf_counter() - start)
+        print(f"[Startup] Failed to initialize data source UID {uid}: {e}")
+        return None
 
+    try:
+        instance.update_data(force=True)  # fetch once immediately
+    except Exception as e:
+        _record_fetch(uid, instance, FetchResult(uid, "error", time.perf_counter() - start, e))
+        # Keep serving the persisted values, the scheduler retries the fetch
+        if DATASOURCES.get(uid) is None:
+            return None
+        INSTANCE_REGISTRY[uid] = instance
+        SCHEDULER.schedule(uid, time.time() + RETRY_DELAY)
+        _set_source_state(uid, state="retrying", name=instance.get_name(), error=str(e),
+                          duration=time.perf_counter() - start)
+        print(f"[Startup] First fetch of data source UID {uid} failed: {e}")
+        return None
+
+    duration = time.perf_counter() - start
+    if DATASOURCES.get(uid) is None:
+        return None  # deleted while warming up
+    INSTANCE_REGISTRY[uid] = instance
+    _schedule_next(uid, instance)
+    return FetchResult(uid, "ok", duration, None)
+
+def _warm_sources(items):
+    """Warm all sources in parallel, then store their values in one batch (one write per file)."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup") as pool:
+        futures = {pool.submit(_warm_source, item): item["uid"] for item in items}
+        for future, uid in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                _set_source_state(uid, state="failed", error=str(e))
+                print(f"[Startup] Warm-up of data source UID {uid} failed: {e}")
+                continue
+            if result is not None:
+                results[result.uid] = result
+
+    if results:
+        _commit_tick(results)
+    for uid, result in results.items():
+        instance = INSTANCE_REGISTRY.get(uid)
+        if instance is None:
+            continue
+        _set_source_state(uid, state="ready", name=instance.get_name(), error=None, duration=result.duration)
+        print(f"[Startup] Initialized instance {instance.get_name()} in {result.duration:.2f}s")
+    print("[Startup] Initialization finished")
 
-def initialize_instances_from_file():
-    """Load all saved data sources from JSON and create their live instances."""
-    print("[Startup] Initializing existing instances")
-    data = load_json(DATASOURCES_PATH)
-    if not isinstance(data, list):
-        return
+def initialize_instances_from_file(background=True):
+    """Create live instances for all saved data sources.
 
-    for item in data:
+    Until a source is warmed up, screens keep showing the values persisted in
+    the JSON files, so the server can serve devices right away. The instances
+    are created and fetched in parallel, in the background unless
+    background=False, and their values are stored in one batch once all of
+    them are done.
+    """
+    print("[Startup] Initializing existing instances")
+    items = []
+    for item in DATASOURCES.all():
         uid = item.get("uid")
         source_name = item.get("source")
         inputs = item.get("inputs")
@@ -339,15 +464,13 @@ def initialize_instances_from_file():
         if not uid or not source_name or not inputs:
             continue  # skip invalid entries
 
-        try:
-            instance = create_source_instance(source_name, inputs, uid)
-            instance.update_data(force=True)  # fetch once immediately
-            INSTANCE_REGISTRY[uid] = instance
-            print(f"[Startup] Initialized instance {instance.get_name()}")
+        _set_source_state(uid, state="pending")
+        items.append(item)
 
-        except Exception as e:
-            print(f"[Startup] Failed to initialize data source UID {uid}: {e}")
-    print("[Startup] Initialization finished")
+    if background:
+        threading.Thread(target=_warm_sources, args=(items,), daemon=True).start()
+    else:
+        _warm_sources(items)
 
 _auto_refresh_started = False
 
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+def format_seconds(secs):
+    return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+
+class DepartureIndex:
+    """Departures of one service day, grouped by stop and sorted by time.
+
+    Built from a ColumnarFeed: the departures of active trips are sorted by
+    (stop, seconds, feed order) into parallel arrays and each stop owns a
+    contiguous slice of them, so "next N departures after t" is a binary
+    search plus a short scan. Trip and route attributes stay interned and
+    are looked up only for the returned departures. Filters (direction,
+    line) are applied during the scan, and the platforms of a stop are
+    merged by time.
+    """
+
+    def __init__(self, feed, active_services, route_type_names, line_pattern):
+        st_trip = feed["stop_times.trip"]
+        st_stop = feed["stop_times.stop"]
+        departure = feed["stop_times.departure"]
+
+        # Trips without a known route are dropped, like the inner merge with routes did
+        trip_active = active_services[feed["trips.service"]] & (feed["trips.route"] >= 0)
+        valid = (st_trip >= 0) & (st_stop >= 0) & (departure >= 0)
+        valid[valid] = trip_active[st_trip[valid]]
+        rows = np.flatnonzero(valid)
+        stops = st_stop[rows]
+        secs = departure[rows]
+        order = np.lexsort((rows, secs, stops))
+
+        self.secs = np.ascontiguousarray(secs[order])
+        self.rows = rows[order]
+        self.trips = np.ascontiguousarray(st_trip[self.rows])
+
+        # Per trip / per route attributes, indexed by their codes
+        self._trip_route = np.array(feed["trips.route"])
+        self._trip_direction = np.array(feed["trips.direction"])
+        self._trip_headsign = np.array(feed["trips.headsign"])
+        self._headsigns = feed.strings["trip_headsign"]
+        route_ids = pd.Series(feed.strings["route_id"], dtype=object)
+        self._route_lines = route_ids.str.extract(line_pattern, expand=False).fillna("").tolist()
+        self._route_vehicles = [route_type_names.get(int(t), "Unknown") for t in feed["routes.route_type"]]
+
+        # stop_id -> (start, end) of its slice
+        sorted_stops = stops[order]
+        stop_id_table = feed.strings["stop_id"]
+        self._slices = {}
+        if len(sorted_stops):
+            bounds = np.flatnonzero(sorted_stops[1:] != sorted_stops[:-1]) + 1
+            starts = np.concatenate(([0], bounds))
+            ends = np.concatenate((bounds, [len(sorted_stops)]))
+            self._slices = {stop_id_table[sorted_stops[s]]: (int(s), int(e)) for s, e in zip(starts, ends)}
+
+        # stop_name -> [(stop_id, platform_code)]
+        self._stops = {}
+        names, platforms = feed.strings["stop_name"], feed.strings["platform_code"]
+        for stop_id, name, platform in zip(stop_id_table, feed["stops.stop_name"], feed["stops.platform_code"]):
+            if name >= 0:
+                self._stops.setdefault(names[name], []).append((stop_id, platforms[platform] if platform >= 0 else None))
+
+    def stop_ids(self, stop_name, platform_code=None):
+        stops = self._stops.get(stop_name, [])
+        if platform_code:
+            return [stop_id for stop_id, platform in stops if platform == str(platform_code)]
+        return [stop_id for stop_id, _ in stops]
+
+    def _scan(self, stop_id, after_secs, direction_id, line_number):
+        start, end = self._slices.get(stop_id, (0, 0))
+        i = start + int(np.searchsorted(self.secs[start:end], after_secs, side="left"))
+        for pos in range(i, end):
+            trip = self.trips[pos]
+            if direction_id is not None and self._trip_direction[trip] != direction_id:
+                continue
+            if line_number is not None and self._route_lines[self._trip_route[trip]] != line_number:
+                continue
+            yield self.secs[pos], self.rows[pos], pos
+
+    def departure(self, pos, offset=0):
+        """The departure at pos as a dict, its time shifted by offset seconds."""
+        trip = self.trips[pos]
+        route = self._trip_route[trip]
+        headsign = self._trip_headsign[trip]
+        return {
+            "departure_time": format_seconds(int(self.secs[pos]) + offset),
+            "trip_headsign": self._headsigns[headsign] if headsign >= 0 else None,
+            "line_number": self._route_lines[route],
+            "vehicle_type": self._route_vehicles[route],
+        }
+
+    def next_departures(self, stop_ids, after_secs, direction_id=None, line_number=None, limit=10):
+        """Return the first limit departures at or after after_secs from any of stop_ids, as dicts."""
+        scan = self.scan(stop_ids, after_secs, direction_id, line_number)
+        return [self.departure(pos) for _, _, pos in itertools.islice(scan, max(int(limit), 0))]
+
+    def scan(self, stop_ids, after_secs, direction_id=None, line_number=None):
+        """Matching departures at or after after_secs from any of stop_ids, lazily in time order.
+
+        Yields (seconds, feed row, position); pass the position to departure().
+        """
+        return heapq.merge(*(self._scan(stop_id, after_secs, direction_id, line_number) for stop_id in set(stop_ids)))
+
+    def memory_bytes(self):
+        arrays = (self.secs, self.rows, self.trips, self._trip_route, self._trip_direction, self._trip_headsign)
+        return int(sum(a.nbytes for a in arrays))
+
+
+def _shifted(scan, rank, offset):
+    for secs, row, pos in scan:
+        yield secs + offset, rank, row, pos
+
+
+def next_departures_across_days(days, stop_ids, after_secs, direction_id=None, line_number=None, limit=10):
+    """Like DepartureIndex.next_departures, over several service days.
+
+    days is [(index, offset)] in service-day order, a departure at GTFS time
+    s of a day happens at s + offset on the queried timeline, and its
+    departure_time is reported on that timeline (so >= 24:00:00 means the
+    next calendar day).
+    """
+    scans = [
+        _shifted(index.scan(stop_ids, after_secs - offset, direction_id, line_number), rank, offset)
+        for rank, (index, offset) in enumerate(days)
+    ]
+    return [
+        days[rank][0].departure(pos, days[rank][1])
+        for _, rank, _, pos in itertools.islice(heapq.merge(*scans), max(int(limit), 0))
+    ]
@@ -1,9 +1,11 @@
 import os
-import re
-import requests
-import pandas as pd
 from datetime import datetime
 import gtfs_kit as gk
+from .feed_cache import FeedCache
+from .departure_index import DepartureIndex, next_departures_across_days
+from .service_calendar import ServiceCalendar
+from .feed_updater import FeedUpdater
+from . import gtfs_columnar
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,27 +15,39 @@ GTFS_ZIP_PATH = os.path.join(DATA_DIR, "gtfs.zip")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-# Download GTFS
-async def update_data():
-    url = "https://www.arcgis.com/sharing/rest/content/items/379d2e9a7907460c8ca7fda1f3e84328/data"
-    print("Downloading GTFS...")
-    response = await requests.get(url)
-    if response.ok:
-        with open(GTFS_ZIP_PATH, "wb") as f:
-            f.write(response.content)
-        print("GTFS downloaded.")
-    else:
-        print("Download failed.")
+# Opened once per process from the columnar cache, which is rebuilt only when the zip changes
+FEED_CACHE = FeedCache(gtfs_columnar.load)
+
+STOPS_TXT_PATH = "./static/DPMB/stops.txt"
+GTFS_URL = "https://www.arcgis.com/sharing/rest/content/items/379d2e9a7907460c8ca7fda1f3e84328/data"
+
+def _on_feed_updated(path):
+    # The new feed's columnar cache is already built, this only opens it
+    FEED_CACHE.get(path)
+    write_stops_txt()
+
+# Download GTFS, checked daily in the background once a DPMB source exists
+FEED_UPDATER = FeedUpdater(GTFS_URL, GTFS_ZIP_PATH, on_update=_on_feed_updated)
+
+def update_data(force=False):
+    """Download the GTFS feed now if it changed, returns True if a new one was installed."""
+    return FEED_UPDATER.check(force=force)
 
 # Load GTFS
 def load_feed():
-    return gk.read_feed(GTFS_ZIP_PATH, dist_units="km")
+    return FEED_CACHE.get(GTFS_ZIP_PATH)
 
 
 # All stops
 def get_all_stops():
     feed = load_feed()
-    return feed.stops[['stop_id', 'stop_name', 'platform_code']].drop_duplicates().sort_values(by='stop_name')
+    return feed.stops_frame().drop_duplicates().sort_values(by='stop_name')
+
+def write_stops_txt(path=STOPS_TXT_PATH):
+    """Stop names for the editor's autocomplete."""
+    df = get_all_stops()["stop_name"].drop_duplicates()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(df.to_string(index=False))
 
 def time_to_seconds(t):
     h, m, s = map(int, t.split(":"))
@@ -52,80 +66,87 @@ ROUTE_TYPE_MAP = {
     32: "Trolleybus"
 }
 
-def get_departures(stop_name, direction_id=None, platform_code=None, current_time_str=None, line_number=None, limit=10):
+LINE_NUMBER_PATTERN = r"L(\d+)D"  # DPMB route ids look like L12D1
+
+def get_service_calendar(feed=None):
+    """Service calendar of feed (default the current one)."""
+    return FEED_CACHE.derived_for(feed or load_feed(), "calendar", ServiceCalendar)
+
+def get_departure_index(service_date, feed=None):
+    """Departure index of the service day service_date (YYYYMMDD), built once per feed and day."""
+    def build(feed):
+        # The calendar must come from the same feed version as the trip rows it masks
+        return DepartureIndex(feed, get_service_calendar(feed).active(service_date), ROUTE_TYPE_MAP, LINE_NUMBER_PATTERN)
+    return FEED_CACHE.derived_for(feed or load_feed(), ("departures", service_date), build)
+
+def _service_days(current_date):
     try:
-        feed = gk.read_feed(GTFS_ZIP_PATH, dist_units="km")
+        feed = load_feed()
+        calendar = get_service_calendar(feed)
+        return [(get_departure_index(date, feed), offset) for date, offset in calendar.service_days(current_date)]
     except Exception as e:
         raise RuntimeError(f"Failed to read GTFS feed: {e}")
 
+def _answer(days, current_time_str, stop_name, direction_id=None, platform_code=None, line_number=None, limit=10):
     try:
-        stops = feed.stops
-        if platform_code:
-            stop_ids = stops[
-                (stops['stop_name'] == stop_name) &
-                (stops['platform_code'].astype(str) == str(platform_code))
-            ]['stop_id'].unique()
-        else:
-            stop_ids = stops[stops['stop_name'] == stop_name]['stop_id'].unique()
-
+        stop_ids = days[1][0].stop_ids(stop_name, platform_code)
         if len(stop_ids) == 0:
             raise RuntimeError(f"No stop IDs found for stop_name='{stop_name}' and platform_code='{platform_code}'")
 
-        if not current_time_str:
-            current_time_str = datetime.now().strftime('%H:%M:%S')
-
-        def time_to_seconds(t):
-            try:
-                h, m, s = map(int, t.split(":"))
-                return h * 3600 + m * 60 + s
-            except Exception:
-                raise RuntimeError(f"Invalid time format: '{t}'")
-
-        current_secs = time_to_seconds(current_time_str)
-
         try:
-            active_service_ids = feed.get_active_services(date=datetime.now().strftime("%Y%m%d"))
-        except Exception as e:
-            raise RuntimeError(f"Failed to get active service IDs: {e}")
-
-        st = feed.stop_times[feed.stop_times['stop_id'].isin(stop_ids)]
-
-        trips_today = feed.trips[feed.trips['service_id'].isin(active_service_ids)]
-        st = st[st['trip_id'].isin(trips_today['trip_id'])]
-
-        st = st[st["departure_time"].apply(time_to_seconds) >= current_secs]
-
-        merged = st.merge(feed.trips, on='trip_id').merge(feed.routes, on='route_id')
+            current_secs = time_to_seconds(current_time_str)
+        except Exception:
+            raise RuntimeError(f"Invalid time format: '{current_time_str}'")
 
         if direction_id is not None:
             try:
-                merged = merged[merged["direction_id"] == int(direction_id)]
+                direction_id = int(direction_id)
             except ValueError:
                 raise RuntimeError(f"Invalid direction_id value: '{direction_id}'")
 
-        def extract_line_number(route_id):
-            match = re.search(r"L(\d+)D", str(route_id))
-            if not match:
-                return ""
-            return match.group(1)
-
-        merged["line_number"] = merged["route_id"].apply(extract_line_number)
-        merged["vehicle_type"] = merged["route_type"].apply(lambda x: ROUTE_TYPE_MAP.get(x, "Unknown"))
-
-        if line_number:
-            merged = merged[merged["line_number"] == str(line_number)]
-
-        try:
-            merged['departure_timedelta'] = pd.to_timedelta(merged['departure_time'])
-        except Exception as e:
-            raise RuntimeError(f"Failed to convert departure_time to timedelta: {e}")
-
-        result = merged.sort_values('departure_timedelta')[['departure_time', 'trip_headsign', 'line_number', 'vehicle_type']]
-        return result.head(limit).to_dict(orient="records")
+        return next_departures_across_days(
+            days, stop_ids, current_secs,
+            direction_id=direction_id,
+            line_number=str(line_number) if line_number else None,
+            limit=limit
+        )
 
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred in get_departures: {e}")
 
+def get_departures(stop_name, direction_id=None, platform_code=None, current_time_str=None, line_number=None, limit=10,
+                   current_date=None):
+    """Next departures from a stop at current_time_str on current_date (YYYYMMDD, default today).
+
+    Trips of yesterday's service day still running after midnight are included,
+    and if today's service runs out the board continues with tomorrow's; their
+    departure_time is then 24:00:00 or more.
+    """
+    now = datetime.now()
+    days = _service_days(current_date or now.strftime("%Y%m%d"))
+    return _answer(days, current_time_str or now.strftime('%H:%M:%S'), stop_name, direction_id, platform_code,
+                   line_number, limit)
+
+def get_departures_batch(queries, current_time_str=None, current_date=None):
+    """Answer many departure queries for the same moment together.
+
+    queries is a list of dicts with get_departures' stop_name, direction_id,
+    platform_code, line_number and limit. The calendar and day indexes are
+    looked up once for all of them. Returns, in order, each query's
+    departures or the RuntimeError it failed with; a feed that can't be
+    read raises for the whole batch.
+    """
+    now = datetime.now()
+    days = _service_days(current_date or now.strftime("%Y%m%d"))
+    current_time_str = current_time_str or now.strftime('%H:%M:%S')
+    results = []
+    for query in queries:
+        try:
+            results.append(_answer(days, current_time_str, **query))
+        except RuntimeError as e:
+            results.append(e)
+    return results
+
 # Trip planning
 def plan_trip(feed, start_stop_id, end_stop_id):
     try:
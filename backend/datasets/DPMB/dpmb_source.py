@@ -1,85 +1,109 @@
 from ..datasource_base import DataSource
-from datetime import datetime
-from .dpmb import update_data, get_departures, get_all_stops
+from .dpmb import FEED_UPDATER, get_departures, get_departures_batch
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from ntplib import NTPClient
+import time
 
 NTP_SERVER = "pool.ntp.org"  # NTP server to synchronize time
 
+def prague_now():
+    """Current time in Brno, from NTP so a wrong server clock doesn't shift the boards."""
+    client = NTPClient()
+    response = client.request(NTP_SERVER, timeout=5)
+    utc_time = datetime.fromtimestamp(response.tx_time, tz=ZoneInfo("UTC"))
+    return utc_time.astimezone(ZoneInfo("Europe/Prague"))
+
 class DPMBSource(DataSource):
+    # Boards due in the same refresh tick are answered together, see update_batch()
+    supports_batch = True
+
     def __init__(self, inputs: dict, uid):
         super().__init__(inputs, uid)
         self.cached_data = None
-        self.week_downloaded = False
+        FEED_UPDATER.start()
 
     def get_name(self):
         return "DPMB - " + self.inputs.get("Stop name")
 
-    def save_all_stops_to_txt(self):
-        df = get_all_stops()["stop_name"].drop_duplicates()
-        with open("./static/DPMB/stops.txt", "w", encoding="utf-8") as f:
-            f.write(df.to_string(index=False))
+    def _query(self):
+        """This board's departure query, as get_departures keyword arguments."""
+        return {
+            "stop_name": self.inputs.get("Stop name"),
+            "direction_id": self.inputs.get("Direction"),
+            "platform_code": self.inputs.get("Platform code") or None,
+            "line_number": self.inputs.get("Line number") or None,
+            "limit": self.inputs.get("Maximum departures shown (default 5)") or 5,
+        }
 
-    def fetch_data(self):
-        stop_name = self.inputs.get("Stop name")
-        platform = self.inputs.get("Platform code") or None
-        direction = self.inputs.get("Direction")
+    def _store(self, departures_list):
+        if departures_list is None:
+            raise ValueError("get_departures returned None")
 
-        client = NTPClient()
-        response = client.request("pool.ntp.org")
-        utc_time = datetime.fromtimestamp(response.tx_time, tz=ZoneInfo("UTC"))
-        now = utc_time.astimezone(ZoneInfo("Europe/Prague"))
+        if departures_list:
+            def format_time(gtfs_time):
+                hours, minutes, seconds = map(int, gtfs_time.split(":"))
+                days, hours = divmod(hours, 24)
+                dt = datetime.strptime(f"{hours:02}:{minutes:02}:{seconds:02}", "%H:%M:%S")
+                return dt.strftime("%H:%M") + (f" (+{days}d)" if days else "")
 
-        if not self.week_downloaded and now.weekday() == 6 and 0 < now.hour:
-            update_data()
-            self.save_all_stops_to_txt()
-            self.week_downloaded = True
 
-        if now.weekday() == 0 and self.week_downloaded:
-            self.week_downloaded = False
+            departures_dict = {
+                str(i)+". row": {
+                    "departure_time": format_time(dep["departure_time"]),
+                    "direction": dep["trip_headsign"],
+                    "number": dep["line_number"],
+                    "type": dep.get("vehicle_type", "Unknown")
+                }
+                for i, dep in enumerate(departures_list, start=1)
+            }
+            self.cached_data = {"departures": departures_dict}
+        else:
+            self.cached_data = {"departures": []}
 
-        current_time = now.strftime("%H:%M:%S")
+    def fetch_data(self):
+        now = prague_now()
 
         try:
-            lmt = self.inputs.get("Maximum departures shown (default 5)") or 5
-            #print(lmt)
-            line = self.inputs.get("Line number") or None
-
-            departures_list = get_departures(stop_name, direction, platform, current_time, line_number=line, limit=lmt)
-            #print(departures_list)
-            if departures_list is None:
-                raise ValueError("get_departures returned None")
-            
-            if departures_list:
-                def format_time(gtfs_time):
-                    hours, minutes, seconds = map(int, gtfs_time.split(":"))
-                    if hours >= 24:
-                        hours -= 24
-                        next_day = True
-                    else:
-                        next_day = False
-                    dt = datetime.strptime(f"{hours:02}:{minutes:02}:{seconds:02}", "%H:%M:%S")
-                    return dt.strftime("%H:%M") + (" (+1d)" if next_day else "")
-
-
-                departures_dict = {
-                    str(i)+". row": {
-                        "departure_time": format_time(dep["departure_time"]),
-                        "direction": dep["trip_headsign"],
-                        "number": dep["line_number"],
-                        "type": dep.get("vehicle_type", "Unknown")
-                    }
-                    for i, dep in enumerate(departures_list, start=1)
-                }
-                self.cached_data = {"departures": departures_dict}
-                #print(self.cached_data)
-            else:
-                self.cached_data = {"departures": []}
+            departures_list = get_departures(
+                current_time_str=now.strftime("%H:%M:%S"), current_date=now.strftime("%Y%m%d"), **self._query()
+            )
+            self._store(departures_list)
         except Exception as e:
             print(f"[DPMBSource] Error fetching departures: {e}")
             self.cached_data = {"departures": []}
 
+    @classmethod
+    def update_batch(cls, instances, force=False):
+        """Update all due boards with one clock request and one batched departure query."""
+        started = time.time()
+        due = [instance for instance in instances if force or instance.is_due(started)]
+        if not due:
+            return {instance.get_uid(): False for instance in instances}
+
+        now = prague_now()
+        try:
+            results = get_departures_batch(
+                [instance._query() for instance in due],
+                current_time_str=now.strftime("%H:%M:%S"), current_date=now.strftime("%Y%m%d")
+            )
+        except Exception as e:
+            results = [e] * len(due)
+
+        for instance, result in zip(due, results):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                instance._store(result)
+            except Exception as e:
+                print(f"[DPMBSource] Error fetching departures: {e}")
+                instance.cached_data = {"departures": []}
+            instance.last_updated = started
+
+        outcomes = {instance.get_uid(): False for instance in instances}
+        outcomes.update({instance.get_uid(): True for instance in due})
+        return outcomes
+
     def get_data(self):
         departures_raw = self.cached_data["departures"] if self.cached_data else {}
 
@@ -92,3 +116,6 @@ class DPMBSource(DataSource):
 
     def get_update_interval(self):
         return 180  # Update every 3 mins
+
+    def get_fetch_timeout(self):
+        return 120  # Parsing the GTFS feed is slow
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeedCache:
+    """Process-wide parsed GTFS feed, shared by every DPMB source.
+
+    get() stats the zip on every call and only re-parses it when its mtime
+    or size changed and its sha256 differs from the loaded one. The new feed
+    is parsed outside the lock and swapped in as a whole, so readers keep
+    using the previous feed until the new one is complete. If the new zip
+    can not be parsed (e.g. while it is being replaced) the previous feed is
+    kept.
+
+    derived() caches structures computed from the loaded feed (indexes,
+    calendars); they are dropped together with the feed they came from.
+    """
+
+    def __init__(self, loader, max_derived=8):
+        # loader(path, sha256) returns the feed, which must have memory_bytes()
+        self._loader = loader
+        self.max_derived = max_derived
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one parse at a time
+        self._derive_lock = threading.RLock()  # one build at a time, builds may use other derived values
+        self._derived = OrderedDict()
+        self._feed = None
+        self._path = None
+        self._signature = None   # (mtime_ns, size) of the file the checks last saw
+        self._sha256 = None      # content hash of the loaded feed
+        self._failed = None      # signature of a zip that failed to parse
+        self.loaded_at = None
+        self.load_seconds = None
+        self.memory_bytes = 0
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, path):
+        """Return the parsed feed of the zip at path, loading it if it changed."""
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if self._feed is not None and self._path == path and self._signature == signature:
+                self.hits += 1
+                return self._feed
+
+        with self._load_lock:
+            # Another thread may have loaded it while we waited
+            with self._lock:
+                if self._feed is not None and self._path == path and self._signature == signature:
+                    self.hits += 1
+                    return self._feed
+                if self._failed == (path, signature) and self._feed is not None:
+                    return self._feed
+
+            sha256 = _file_sha256(path)
+            with self._lock:
+                if self._feed is not None and self._path == path and self._sha256 == sha256:
+                    # Touched or re-downloaded, but the same content
+                    self._signature = signature
+                    self.hits += 1
+                    return self._feed
+
+            start = time.perf_counter()
+            try:
+                feed = self._loader(path, sha256)
+            except Exception as e:
+                with self._lock:
+                    self._failed = (path, signature)
+                    if self._feed is not None:
+                        print(f"[DPMB] Failed to load GTFS feed {path}, keeping the previous one: {e}")
+                        return self._feed
+                raise
+            load_seconds = time.perf_counter() - start
+            memory = feed.memory_bytes()
+
+            with self._lock:
+                self._feed = feed
+                self._derived.clear()
+                self._path = path
+                self._signature = signature
+                self._sha256 = sha256
+                self._failed = None
+                self.loaded_at = time.time()
+                self.load_seconds = load_seconds
+                self.memory_bytes = memory
+                self.loads += 1
+            print(f"[DPMB] Loaded GTFS feed in {load_seconds:.1f}s ({memory / 1024 / 1024:.1f} MB)")
+            return feed
+
+    def derived(self, path, key, build):
+        """Return build(feed) for the current feed of path, cached under key.
+
+        The least recently used structures beyond max_derived are dropped.
+        """
+        return self.derived_for(self.get(path), key, build)
+
+    def derived_for(self, feed, key, build):
+        """Return build(feed) for a feed returned by get(), cached under key while it is the current one.
+
+        Builds that need other derived values of the same feed use this, so a
+        feed swapped in meanwhile never mixes into them.
+        """
+        with self._lock:
+            if self._feed is feed and key in self._derived:
+                self._derived.move_to_end(key)
+                return self._derived[key]
+
+        with self._derive_lock:
+            with self._lock:
+                if self._feed is feed and key in self._derived:
+                    return self._derived[key]
+            value = build(feed)
+            with self._lock:
+                if self._feed is feed:  # not swapped while building
+                    self._derived[key] = value
+                    while len(self._derived) > self.max_derived:
+                        self._derived.popitem(last=False)
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._feed = None
+            self._derived.clear()
+            self._path = self._signature = self._sha256 = self._failed = None
+            self.memory_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self._path,
+                "sha256": self._sha256,
+                "loaded_at": self.loaded_at,
+                "load_seconds": self.load_seconds,
+                "memory_bytes": self.memory_bytes,
+                "derived": {
+                    str(key): value.memory_bytes() if hasattr(value, "memory_bytes") else None
+                    for key, value in self._derived.items()
+                },
+                "loads": self.loads,
+                "hits": self.hits,
+            }
@@ -0,0 +1,191 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+import requests
+
+from . import gtfs_columnar
+from .feed_cache import _file_sha256
+
+# Checks are conditional requests, so asking daily costs one small round trip when nothing changed
+CHECK_INTERVAL = 24 * 3600
+RETRY_INTERVAL = 3600
+REQUEST_TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+REQUIRED_FILES = ("stops.txt", "routes.txt", "trips.txt", "stop_times.txt")
+
+
+def validate_zip(path):
+    """Raise ValueError unless path is an intact zip with the GTFS tables we read."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            bad = zf.testzip()
+            names = set(zf.namelist())
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a zip file: {e}")
+    if bad is not None:
+        raise ValueError(f"Corrupt member {bad}")
+    missing = [name for name in REQUIRED_FILES if name not in names]
+    if "calendar.txt" not in names and "calendar_dates.txt" not in names:
+        missing.append("calendar.txt or calendar_dates.txt")
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+
+class FeedUpdater:
+    """Keeps the GTFS zip at zip_path up to date with url.
+
+    check() sends a conditional GET (If-None-Match / If-Modified-Since from
+    the last download), streams a new feed to a temp file next to the zip,
+    validates it, builds its columnar cache and only then swaps it in with
+    os.replace, so readers never see a partial zip. on_update(zip_path) is
+    called once per installed feed. The validators and check times are kept
+    in <zip>.meta.json.
+
+    start() runs check() in a background thread every interval seconds
+    (right away if there is no zip yet).
+    """
+
+    def __init__(self, url, zip_path, on_update=None, interval=CHECK_INTERVAL, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.zip_path = zip_path
+        self.meta_path = zip_path + ".meta.json"
+        self.on_update = on_update
+        self.interval = interval
+        self.timeout = timeout
+        self._lock = threading.Lock()  # one check at a time
+        self._thread = None
+        self._start_lock = threading.Lock()  # check() holds _lock for a whole download, start() must not wait for it
+        self._wake = threading.Event()
+        self.last_error = None
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.meta_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp_path, self.meta_path)
+
+    def _download(self, headers):
+        """Stream the feed to a temp file, returns (path or None if not modified, response headers)."""
+        with requests.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return None, response.headers
+            response.raise_for_status()
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.zip_path) or ".", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            return tmp_path, response.headers
+
+    def check(self, force=False):
+        """Download and install the feed if it changed. Returns True if a new feed was installed."""
+        with self._lock:
+            meta = self._load_meta()
+            headers = {}
+            if not force and os.path.exists(self.zip_path):
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            print("[DPMB] Checking for a new GTFS feed...")
+            try:
+                tmp_path, response_headers = self._download(headers)
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            meta["checked_at"] = time.time()
+            if tmp_path is None:
+                print("[DPMB] GTFS feed not modified.")
+                self.last_error = None
+                self._save_meta(meta)
+                return False
+
+            try:
+                validate_zip(tmp_path)
+                sha256 = _file_sha256(tmp_path)
+                if sha256 == meta.get("sha256") and os.path.exists(self.zip_path):
+                    # Server without conditional request support, same content
+                    os.remove(tmp_path)
+                    installed = False
+                else:
+                    # Convert before swapping, a feed that can't be converted never replaces a good one.
+                    # Readers still on the old zip keep finding its build until the swap.
+                    cache_dir = gtfs_columnar.cache_dir_for(self.zip_path)
+                    gtfs_columnar.build(tmp_path, sha256, cache_dir)
+                    os.replace(tmp_path, self.zip_path)
+                    gtfs_columnar.prune(cache_dir, sha256)
+                    installed = True
+            except Exception as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self.last_error = f"Rejected downloaded feed: {e}"
+                raise RuntimeError(self.last_error)
+
+            meta.update({
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "sha256": sha256,
+            })
+            if installed:
+                meta["updated_at"] = time.time()
+            self._save_meta(meta)
+            self.last_error = None
+
+        if not installed:
+            print("[DPMB] GTFS feed unchanged.")
+            return False
+        print("[DPMB] New GTFS feed installed.")
+        if self.on_update is not None:
+            self.on_update(self.zip_path)
+        return True
+
+    def _next_check_delay(self):
+        if not os.path.exists(self.zip_path):
+            return 0
+        checked_at = self._load_meta().get("checked_at", 0)
+        return max(0.0, checked_at + self.interval - time.time())
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self._next_check_delay())
+            self._wake.clear()
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[DPMB] GTFS feed update failed: {e}")
+                self._wake.wait(RETRY_INTERVAL)
+                self._wake.clear()
+
+    def start(self):
+        """Start the background checks (once per process)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="gtfs-updater")
+                self._thread.start()
+
+    def status(self):
+        meta = self._load_meta()
+        return {
+            "url": self.url,
+            "checked_at": meta.get("checked_at"),
+            "updated_at": meta.get("updated_at"),
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+            "sha256": meta.get("sha256"),
+            "last_error": self.last_error,
+        }
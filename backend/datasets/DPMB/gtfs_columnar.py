@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Bump when the layout changes, older caches are rebuilt
+FORMAT_VERSION = 2
+# Unfinished build directories older than this are left over from a crash
+STALE_BUILD_AGE = 3600
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# table -> columns kept from the feed, strings are interned, times become seconds
+SCHEMA = {
+    "stops": ["stop_id", "stop_name", "platform_code"],
+    "routes": ["route_id", "route_type"],
+    "trips": ["trip_id", "route_id", "service_id", "trip_headsign", "direction_id"],
+    "stop_times": ["trip_id", "stop_id", "departure_time"],
+    "calendar": ["service_id"] + WEEKDAYS + ["start_date", "end_date"],
+    "calendar_dates": ["service_id", "date", "exception_type"],
+}
+
+
+def cache_dir_for(zip_path):
+    return os.path.join(os.path.dirname(os.path.abspath(zip_path)), "columnar")
+
+
+def _read_table(zf, table):
+    name = f"{table}.txt"
+    if name not in zf.namelist():
+        return pd.DataFrame({c: pd.Series(dtype=str) for c in SCHEMA[table]})
+    with zf.open(name) as f:
+        df = pd.read_csv(f, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [c.strip() for c in df.columns]
+    for column in SCHEMA[table]:
+        if column not in df.columns:
+            df[column] = ""
+    return df[SCHEMA[table]]
+
+
+def _ints(series, missing=-1):
+    """Integer column, empty values become missing."""
+    return pd.to_numeric(series.replace("", None), errors="coerce").fillna(missing).to_numpy(dtype=np.int64)
+
+
+def _seconds(series):
+    """H:MM:SS -> seconds since the start of the service day (may exceed 24 h), empty -> -1."""
+    out = np.full(len(series), -1, dtype=np.int32)
+    present = (series != "").to_numpy()
+    if present.any():
+        parts = series[present].str.split(":", expand=True).astype(np.int64)
+        out[present] = (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy()
+    return out
+
+
+def _codes(series, uniques):
+    """Positions of series values in uniques (-1 if not there)."""
+    return pd.Index(uniques).get_indexer(series).astype(np.int32)
+
+
+def _intern(series):
+    """Interned string column: (int32 codes, list of strings), empty strings become code -1."""
+    codes, uniques = pd.factorize(series.replace("", None), use_na_sentinel=True)
+    return codes.astype(np.int32), [str(u) for u in uniques]
+
+
+def _version_name(sha256):
+    return f"{sha256}-v{FORMAT_VERSION}"
+
+
+def build(zip_path, sha256, cache_dir=None):
+    """Convert the GTFS zip into a columnar cache directory and return its path.
+
+    Every column is a .npy file, strings are interned into tables stored in
+    strings.json and referenced by int32 codes. Each feed gets its own
+    directory named after the zip's hash: the conversion is written to a
+    temporary directory which is then renamed into place, so readers never
+    see a partial cache and pick the build of the zip they hashed. Builds of
+    other feeds are left alone, see prune().
+    """
+    cache_dir = cache_dir or cache_dir_for(zip_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as zf:
+        tables = {table: _read_table(zf, table) for table in SCHEMA}
+
+    stops, routes, trips = tables["stops"], tables["routes"], tables["trips"]
+    stop_times, calendar, calendar_dates = tables["stop_times"], tables["calendar"], tables["calendar_dates"]
+
+    service_ids = pd.unique(pd.concat([trips["service_id"], calendar["service_id"], calendar_dates["service_id"]]))
+    stop_names, stop_name_table = _intern(stops["stop_name"])
+    platforms, platform_table = _intern(stops["platform_code"])
+    headsigns, headsign_table = _intern(trips["trip_headsign"])
+
+    strings = {
+        "stop_id": [str(s) for s in stops["stop_id"]],
+        "stop_name": stop_name_table,
+        "platform_code": platform_table,
+        "route_id": [str(r) for r in routes["route_id"]],
+        "service_id": [str(s) for s in service_ids],
+        "trip_headsign": headsign_table,
+    }
+    arrays = {
+        "stops.stop_name": stop_names,
+        "stops.platform_code": platforms,
+        "routes.route_type": _ints(routes["route_type"]).astype(np.int32),
+        "trips.route": _codes(trips["route_id"], routes["route_id"]),
+        "trips.service": _codes(trips["service_id"], service_ids),
+        "trips.headsign": headsigns,
+        "trips.direction": _ints(trips["direction_id"]).astype(np.int8),
+        "stop_times.trip": _codes(stop_times["trip_id"], trips["trip_id"]),
+        "stop_times.stop": _codes(stop_times["stop_id"], stops["stop_id"]),
+        "stop_times.departure": _seconds(stop_times["departure_time"]),
+        "calendar.service": _codes(calendar["service_id"], service_ids),
+        "calendar.weekdays": np.stack([_ints(calendar[d], 0) for d in WEEKDAYS], axis=1).astype(np.uint8)
+                             if len(calendar) else np.zeros((0, 7), dtype=np.uint8),
+        "calendar.start": _ints(calendar["start_date"]).astype(np.int32),
+        "calendar.end": _ints(calendar["end_date"]).astype(np.int32),
+        "calendar_dates.service": _codes(calendar_dates["service_id"], service_ids),
+        "calendar_dates.date": _ints(calendar_dates["date"]).astype(np.int32),
+        "calendar_dates.exception": _ints(calendar_dates["exception_type"]).astype(np.int8),
+    }
+
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".build-")
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, "strings.json"), "w", encoding="utf-8") as f:
+        json.dump(strings, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT_VERSION, "sha256": sha256, "built_at": datetime.now().isoformat()}, f)
+
+    version_dir = os.path.join(cache_dir, _version_name(sha256))
+    try:
+        os.rename(tmp_dir, version_dir)
+    except OSError:
+        # Built concurrently by someone else, theirs is the same
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(version_dir):
+            raise
+    return version_dir
+
+
+def prune(cache_dir, keep_sha256):
+    """Delete every build except the one of keep_sha256, memory maps still open on them stay valid."""
+    keep = _version_name(keep_sha256)
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry == keep:
+            continue
+        if entry.startswith(".build-") and time.time() - os.path.getmtime(path) < STALE_BUILD_AGE:
+            continue  # a build still running
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def _current_dir(cache_dir, sha256):
+    version_dir = os.path.join(cache_dir, _version_name(sha256))
+    try:
+        with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != FORMAT_VERSION or meta.get("sha256") != sha256:
+        return None
+    return version_dir
+
+
+class ColumnarFeed:
+    """A GTFS feed loaded from the columnar cache.
+
+    Numeric columns are read-only memory maps, so opening a feed costs
+    little more than reading the string tables.
+    """
+
+    def __init__(self, version_dir):
+        self.path = version_dir
+        with open(os.path.join(version_dir, "strings.json"), encoding="utf-8") as f:
+            self.strings = json.load(f)
+        self.columns = {
+            name[:-len(".npy")]: np.load(os.path.join(version_dir, name), mmap_mode="r")
+            for name in os.listdir(version_dir) if name.endswith(".npy")
+        }
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def active_services(self, date):
+        """Boolean mask over service codes active on date (YYYYMMDD string), like gtfs_kit's get_active_services."""
+        day = int(date)
+        weekday = datetime.strptime(date, "%Y%m%d").weekday()
+        active = np.zeros(len(self.strings["service_id"]), dtype=bool)
+        runs = (self["calendar.start"] <= day) & (self["calendar.end"] >= day) & (self["calendar.weekdays"][:, weekday] == 1)
+        active[self["calendar.service"][runs]] = True
+
+        on_day = self["calendar_dates.date"] == day
+        added = self["calendar_dates.service"][on_day & (self["calendar_dates.exception"] == 1)]
+        removed = self["calendar_dates.service"][on_day & (self["calendar_dates.exception"] == 2)]
+        active[added] = True
+        active[removed] = False
+        return active
+
+    def stops_frame(self):
+        """stop_id, stop_name and platform_code of all stops as a DataFrame."""
+        def decode(codes, table):
+            return [table[c] if c >= 0 else None for c in codes]
+        return pd.DataFrame({
+            "stop_id": self.strings["stop_id"],
+            "stop_name": decode(self["stops.stop_name"], self.strings["stop_name"]),
+            "platform_code": decode(self["stops.platform_code"], self.strings["platform_code"]),
+        })
+
+    def memory_bytes(self):
+        """Bytes of the mapped columns (shared page cache, not private memory)."""
+        return int(sum(a.nbytes for a in self.columns.values()))
+
+
+def load(zip_path, sha256, cache_dir=None):
+    """Open the columnar cache of a GTFS zip, converting the zip first if the cache is missing or stale."""
+    cache_dir = cache_dir or cache_dir_for(zip_path)
+    version_dir = _current_dir(cache_dir, sha256)
+    if version_dir is None:
+        print(f"[DPMB] Building columnar GTFS cache in {cache_dir}")
+        version_dir = build(zip_path, sha256, cache_dir)
+    return ColumnarFeed(version_dir)
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime, timedelta
+
+# Service days precomputed around the first date asked for: yesterday .. a week ahead
+WINDOW_BEFORE = 1
+WINDOW_AFTER = 7
+
+DAY_SECONDS = 24 * 3600
+
+
+def _shift(date, days):
+    return (datetime.strptime(date, "%Y%m%d") + timedelta(days=days)).strftime("%Y%m%d")
+
+
+class ServiceCalendar:
+    """Active service sets of a feed for a rolling window of service days.
+
+    A GTFS service day starts at midnight of its date, but its trips may run
+    past 24:00:00 into the next calendar day. So a moment on date D at
+    t seconds after midnight can be served by trips of three service days:
+    D-1 (times from t + 24 h on), D (from t on) and D+1 (every trip; it is
+    only reached when a board asks for more departures than D has left).
+
+    Masks are computed for the whole window at once; a date outside the
+    window moves the window there.
+    """
+
+    def __init__(self, feed, before=WINDOW_BEFORE, after=WINDOW_AFTER):
+        self._feed = feed
+        self.before = before
+        self.after = after
+        self._masks = {}  # YYYYMMDD -> boolean mask over service codes
+        self._lock = threading.Lock()
+
+    def _fill_window(self, date):
+        masks = {}
+        for offset in range(-self.before, self.after + 1):
+            day = _shift(date, offset)
+            masks[day] = self._masks.get(day)
+            if masks[day] is None:
+                masks[day] = self._feed.active_services(day)
+        self._masks = masks
+
+    def active(self, date):
+        """Boolean mask over the feed's service codes running on service day date (YYYYMMDD)."""
+        with self._lock:
+            if date not in self._masks:
+                self._fill_window(date)
+            return self._masks[date]
+
+    def service_days(self, date):
+        """[(service date, offset in seconds)] whose trips can depart on calendar date date.
+
+        A departure at GTFS time s of service day d happens at s + offset
+        seconds after midnight of date.
+        """
+        return [(_shift(date, -1), -DAY_SECONDS), (date, 0), (_shift(date, 1), DAY_SECONDS)]
+
+    def window(self):
+        with self._lock:
+            return sorted(self._masks)
@@ -1,6 +1,8 @@
 import requests
 from dataclasses import dataclass
 
+REQUEST_TIMEOUT = 10  # seconds
+
 @dataclass
 class WatherWidgetData:
     main: str
@@ -10,7 +12,7 @@ class WatherWidgetData:
 
 
 def get_lat_lon_city(city_name, API_key, state_code="", country_code=""):
-    resp = requests.get(f'http://api.openweathermap.org/geo/1.0/direct?q={city_name},{state_code},{country_code}&appid={API_key}').json()
+    resp = requests.get(f'http://api.openweathermap.org/geo/1.0/direct?q={city_name},{state_code},{country_code}&appid={API_key}', timeout=REQUEST_TIMEOUT).json()
     data = resp[0]
     #print(data)
     lat, lon = data.get('lat'), data.get('lon')
@@ -18,14 +20,14 @@ def get_lat_lon_city(city_name, API_key, state_code="", country_code=""):
 
 #ZIP code may be needed to have a space in it
 def get_lat_lon_zip(zip_code, country_code, API_key):
-    resp = requests.get(f'http://api.openweathermap.org/geo/1.0/zip?zip={zip_code},{country_code}&appid={API_key}').json()
+    resp = requests.get(f'http://api.openweathermap.org/geo/1.0/zip?zip={zip_code},{country_code}&appid={API_key}', timeout=REQUEST_TIMEOUT).json()
     lat, lon = resp.get('lat'), resp.get('lon')
     return lat, lon
 
 
 def get_weather_by_city(city_name, API_key, units="metric", state_code="", country_code=""):
     lat, lon = get_lat_lon_city(city_name, API_key, state_code, country_code)
-    resp = requests.get(f'https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_key}&units={units}').json()
+    resp = requests.get(f'https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_key}&units={units}', timeout=REQUEST_TIMEOUT).json()
     data = WatherWidgetData(
         main=resp.get('weather')[0].get('main'),
         desc=resp.get('weather')[0].get('description'),
@@ -36,7 +38,7 @@ def get_weather_by_city(city_name, API_key, units="metric", state_code="", count
 
 def get_weather_by_zip(zip_code, country_code, API_key, units="metric", state_code=""):
     lat, lon = get_lat_lon_zip(zip_code, country_code, API_key)
-    resp = requests.get(f'https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_key}&units={units}').json()
+    resp = requests.get(f'https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_key}&units={units}', timeout=REQUEST_TIMEOUT).json()
     data = WatherWidgetData(
         main=resp.get('weather')[0].get('main'),
         desc=resp.get('weather')[0].get('description'),
@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 import time
 
 class DataSource(ABC):
+    # Set by sources whose update_batch() shares work between instances
+    supports_batch = False
+
     def __init__(self, inputs: dict, uid : int):
         self.inputs = inputs
         self.uid = uid
@@ -31,11 +34,37 @@ class DataSource(ABC):
         """Return the unique identifier for this data source."""
         return self.uid
 
+    def get_fetch_timeout(self) -> float:
+        """Return how many seconds a fetch may take before the refresh loop gives up on it."""
+        return 30
+
+    def is_due(self, now=None) -> bool:
+        """Return True if the update interval has passed since the last fetch."""
+        if now is None:
+            now = time.time()
+        return (now - self.last_updated) >= self.get_update_interval()
+
     def update_data(self, force=False):
         """Fetch new data if update interval has passed, or force fetch."""
         now = time.time()
-        if force or (now - self.last_updated) >= self.get_update_interval():
+        if force or self.is_due(now):
             self.fetch_data()
             self.last_updated = now
             return True
         return False
+
+    @classmethod
+    def update_batch(cls, instances, force=False):
+        """Update several instances of this class that are due in the same tick.
+
+        Returns {uid: True if updated, False if not due, or the exception it
+        failed with}. Sources that can answer many instances with one request
+        override this and set supports_batch.
+        """
+        outcomes = {}
+        for instance in instances:
+            try:
+                outcomes[instance.get_uid()] = instance.update_data(force=force)
+            except Exception as e:
+                outcomes[instance.get_uid()] = e
+        return outcomes
@@ -0,0 +1,101 @@
+"""Delta frames for partial e-ink refresh.
+
+A delta frame describes how to turn a frame the device already shows (the
+base) into the new one. Rectangles are in packed-byte coordinates, i.e. x and
+width count bytes of a packed row (8 pixels for 1bpp, 2 pixels for 4bpp), y and
+height count rows, so the device can copy payloads straight into its buffer.
+
+Wire format (all integers little-endian uint16):
+    full frame:  b'F' + packed frame
+    delta frame: b'D' + stride, rows, rect_count
+                 + rect_count * (x, y, w, h, w*h payload bytes)
+"""
+import struct
+
+import numpy as np
+
+KIND_FULL = b'F'
+KIND_DELTA = b'D'
+
+_HEADER = struct.Struct('<HHH')
+_RECT = struct.Struct('<HHHH')
+
+# Send the full frame once the delta is larger than this fraction of it
+DEFAULT_THRESHOLD = 0.5
+# Dirty row bands closer than this many rows are merged into one rectangle
+MERGE_GAP = 4
+
+
+def dirty_rects(base: bytes, new: bytes, rows: int, merge_gap=MERGE_GAP):
+    """Return [(x, y, w, h)] rectangles (packed-byte units) covering every changed byte."""
+    stride = len(new) // rows
+    old = np.frombuffer(base, dtype=np.uint8).reshape(rows, stride)
+    cur = np.frombuffer(new, dtype=np.uint8).reshape(rows, stride)
+    diff = old != cur
+
+    dirty_rows = np.flatnonzero(diff.any(axis=1))
+    if dirty_rows.size == 0:
+        return []
+
+    # Split the dirty rows into bands wherever the gap between them is too big
+    breaks = np.flatnonzero(np.diff(dirty_rows) > merge_gap + 1)
+    starts = np.concatenate(([dirty_rows[0]], dirty_rows[breaks + 1]))
+    ends = np.concatenate((dirty_rows[breaks], [dirty_rows[-1]])) + 1
+
+    rects = []
+    for y0, y1 in zip(starts, ends):
+        cols = np.flatnonzero(diff[y0:y1].any(axis=0))
+        x0, x1 = int(cols[0]), int(cols[-1]) + 1
+        rects.append((x0, int(y0), x1 - x0, int(y1 - y0)))
+    return rects
+
+
+def encode_full(frame: bytes) -> bytes:
+    return KIND_FULL + frame
+
+
+def encode_delta(base, new: bytes, rows: int, threshold=DEFAULT_THRESHOLD) -> bytes:
+    """Encode new against base, falling back to a full frame.
+
+    The full frame is used when there is no usable base (missing or a
+    different size) or when the delta exceeds threshold * len(new).
+    """
+    if base is None or len(base) != len(new) or rows <= 0 or len(new) % rows:
+        return encode_full(new)
+
+    stride = len(new) // rows
+    rects = dirty_rects(base, new, rows)
+    cur = np.frombuffer(new, dtype=np.uint8).reshape(rows, stride)
+
+    parts = [KIND_DELTA, _HEADER.pack(stride, rows, len(rects))]
+    size = 1 + _HEADER.size
+    limit = threshold * len(new)
+    for x, y, w, h in rects:
+        parts.append(_RECT.pack(x, y, w, h))
+        parts.append(cur[y:y + h, x:x + w].tobytes())
+        size += _RECT.size + w * h
+        if size > limit:
+            return encode_full(new)
+    return b''.join(parts)
+
+
+def apply_delta(base, payload: bytes) -> bytes:
+    """Reference decoder: rebuild the new frame from base and an encoded payload."""
+    kind, body = payload[:1], payload[1:]
+    if kind == KIND_FULL:
+        return bytes(body)
+    if kind != KIND_DELTA:
+        raise ValueError(f"Unknown frame kind {kind!r}")
+
+    stride, rows, count = _HEADER.unpack_from(body, 0)
+    if base is None or len(base) != stride * rows:
+        raise ValueError("Delta frame does not match the base frame size")
+
+    frame = np.frombuffer(base, dtype=np.uint8).reshape(rows, stride).copy()
+    offset = _HEADER.size
+    for _ in range(count):
+        x, y, w, h = _RECT.unpack_from(body, offset)
+        offset += _RECT.size
+        frame[y:y + h, x:x + w] = np.frombuffer(body, dtype=np.uint8, count=w * h, offset=offset).reshape(h, w)
+        offset += w * h
+    return frame.tobytes()
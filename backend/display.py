@@ -2,26 +2,78 @@ import os
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 import io
+import tempfile
+import threading
+import functools
+import dithering
+from asset_cache import ASSET_CACHE
+from metrics import RENDER_STAGE_DURATION
+import request_timing
+
+FONTS_DIR = os.path.join("static", "fonts")
+FONT_CACHE_SIZE = 64
+
+class FontRegistry:
+    """Index of the .ttf files in static/fonts.
+
+    The directory is listed once and re-indexed only when its mtime changes,
+    resolved (family, italic) lookups are memoized until then.
+    """
+
+    def __init__(self, fonts_dir=FONTS_DIR):
+        self.fonts_dir = fonts_dir
+        self._mtime = None
+        self._files = []  # (filename, is_italic) in directory order
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.fonts_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        files = []
+        if mtime is not None:
+            files = [(f, "Italic" in f) for f in os.listdir(self.fonts_dir) if f.lower().endswith(".ttf")]
+
+        self._files, self._resolved = files, {}
+        self._mtime = mtime
+        _load_font.cache_clear()
+
+    def resolve(self, family, is_italic=False):
+        """Return the font path for a family, preferring the requested italic style."""
+        with self._lock:
+            self._refresh()
+            key = (family, is_italic)
+            if key not in self._resolved:
+                self._resolved[key] = os.path.join(self.fonts_dir, self._pick(family, is_italic))
+            return self._resolved[key]
+
+    def _pick(self, family, is_italic):
+        matching = [(f, it) for f, it in self._files if f.startswith(family)]
+        # The first file of the family in the requested style, then any file of the family
+        for f, it in matching:
+            if it == is_italic:
+                return f
+        if matching:
+            return matching[0][0]
+        return f"{family}.ttf"
+
+FONT_REGISTRY = FontRegistry()
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(font_path, size):
+    return ImageFont.truetype(font_path, size)
+
+def get_font(family, size, is_italic=False) -> ImageFont.FreeTypeFont:
+    """Return a loaded font, shared between renders (LRU cache keyed by path and size)."""
+    return _load_font(FONT_REGISTRY.resolve(family, is_italic), size)
 
 def _get_font_path(family, is_italic=False):
-    fonts_dir = os.path.join("static", "fonts")
-    candidates = [f for f in os.listdir(fonts_dir) if f.lower().endswith(".ttf")]
-
-    if is_italic:
-        # Only look at files that BOTH start with family and contain Italic
-        for f in candidates:
-            if f.startswith(family) and "Italic" in f:
-                return os.path.join(fonts_dir, f)
-    else:
-        # Prefer files that start with family AND do not contain Italic
-        for f in candidates:
-            if f.startswith(family) and "Italic" not in f:
-                return os.path.join(fonts_dir, f)
-    for f in candidates:
-        if f.startswith(family):
-            return os.path.join(fonts_dir, f)
-
-    return os.path.join(fonts_dir, f"{family}.ttf")
+    return FONT_REGISTRY.resolve(family, is_italic)
 
 # For drawing value texts that are not dictionaries but not simple strings
 def draw_key_values(
@@ -51,7 +103,13 @@ def draw_key_values(
 
     return cur_y - y
 
-def render_display(display_data, output_path="rendered.png", rotated=False):
+def render_display(display_data, output_path=None, rotated=False, levels=None, dither_method=None):
+    """Render the screen widgets and return the canvas as a PIL image.
+
+    The canvas is also saved as PNG to output_path (path or file-like) if given.
+    With levels (gray levels of the target display) Image widgets are dithered,
+    using the widget's "dither" method, else dither_method, else the default.
+    """
     if rotated:
         width, height = display_data["resolutionY"], display_data["resolutionX"]
     else:
@@ -68,8 +126,8 @@ def render_display(display_data, output_path="rendered.png", rotated=False):
         italic    = widget.get("isItalic", False)
         bold      = widget.get("isBold", False)
 
-        font_path = _get_font_path(family, is_italic=italic)
-        font      = ImageFont.truetype(font_path, size)
+        with request_timing.stage("font"):
+            font  = get_font(family, size, is_italic=italic)
 
         # For simulating bold (loading from bold font wasn't working)
         stroke_w = max(1, size // 200) if bold else 0
@@ -126,15 +184,25 @@ def render_display(display_data, output_path="rendered.png", rotated=False):
             draw.rectangle([x, y, x+int(bar_w*pct), y+bar_h],
                             fill=widget.get("color","blue"))
         elif widget["type"] == "Image" and widget.get("filename"):
-            img = Image.open(f"./static/uploads/{widget['filename']}")\
-                        .resize((widget["width"], widget["height"]))
+            filename = widget['filename']
+            img_size = (widget["width"], widget["height"])
+            method = widget.get("dither") or dither_method or dithering.DEFAULT_METHOD
+            if levels and method != "none":
+                key = (filename, os.stat(ASSET_CACHE.path(filename)).st_mtime_ns, img_size, levels, method)
+                img = dithering.DITHER_CACHE.get_or_dither(
+                    key, lambda: ASSET_CACHE.get(filename, img_size), levels, method
+                )
+            else:
+                img = ASSET_CACHE.get(filename, img_size)
             canvas.paste(img, (x, y))
         else:
             print(f"[RENDERING]Unknown widget type: {widget.get('type')}")
 
-    canvas.save(output_path, format='PNG')
     print("[RENDERING] Rendering complete.")
-    print(f"[RENDERING] Saved to {output_path}")
+    if output_path is not None:
+        canvas.save(output_path, format='PNG')
+        print(f"[RENDERING] Saved to {output_path}")
+    return canvas
 
 
 def draw_table(draw, x, y, table_data, font, padding=0, row_height=None, header_stroke=1):
@@ -187,12 +255,9 @@ def draw_table(draw, x, y, table_data, font, padding=0, row_height=None, header_
 
 
 
-def transform_image(png_bytes: bytes,
-                     rotated: bool,
-                     flipX: bool,
-                     flipY: bool) -> bytes:
-
-    img = Image.open(io.BytesIO(png_bytes)).convert('RGB')
+def transform_canvas(img, rotated: bool, flipX: bool, flipY: bool):
+    """Apply the screen's flip/rotation flags to a rendered PIL image."""
+    img = img.convert('RGB')
 
     # Mirror first (so rotation acts on the flipped result)
     if flipX:
@@ -204,77 +269,139 @@ def transform_image(png_bytes: bytes,
     if rotated:
         img = img.rotate(-90, expand=True)
 
+    return img
+
+def transform_image(png_bytes: bytes,
+                     rotated: bool,
+                     flipX: bool,
+                     flipY: bool) -> bytes:
+
+    img = transform_canvas(Image.open(io.BytesIO(png_bytes)), rotated, flipX, flipY)
+
     # Serialize back to PNG bytes
     out = io.BytesIO()
     img.save(out, format='PNG')
     return out.getvalue()
 
+def pack_1bpp(image, width, height) -> bytes:
+    """Pack a PIL image into a 1bpp framebuffer (MSB first, 1 = white).
+
+    Every row is padded with zero bits to a whole number of bytes, which is
+    what GxEPD2's drawImage expects.
+    """
+    image = image.convert('L').resize((width, height), resample=Image.NEAREST)
+    pixels = np.asarray(image) > 128
+    return np.packbits(pixels, axis=1).tobytes()
+
 def convert_image_to_1bpp_bin(input_path, output_path, width, height):
+    """Convert an image file (or file-like object) to 1bpp data.
+
+    Returns the packed bytes; they are also written to output_path unless it is None.
+    """
     try:
-        image = Image.open(input_path).convert('L')
-        image = image.resize((width, height), resample=Image.NEAREST)
-        image = image.point(lambda p: 255 if p > 128 else 0, mode='1')
-
-        # Convert image to numpy array for easier manipulation
-        pixels = np.array(image, dtype=np.uint8)
-
-        byte_array = bytearray()
-
-        bytes_per_row = (width + 7) // 8  
-        for y in range(height):
-            byte = 0
-            bit_count = 0
-            for x in range(width):
-                byte = (byte << 1) | pixels[y, x]
-                bit_count += 1
-                if bit_count == 8:
-                    try:
-                        byte_array.append(byte)
-                        byte = 0
-                        bit_count = 0
-                    except Exception as e:
-                        print(f"Error: {e}")
-            if bit_count > 0:
-                byte = byte << (8 - bit_count)
-                byte_array.append(byte)
-
-            # Pad to 32 bytes per row if needed
-            while len(byte_array) % bytes_per_row != 0:
-                byte_array.append(0x00)
-
-        with open(output_path, 'wb') as f:
-            f.write(byte_array)
-
-        return f"Saved {len(byte_array)} bytes to {output_path}"
+        with Image.open(input_path) as image:
+            data = pack_1bpp(image, width, height)
+
+        if output_path is not None:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+
+        return data
     except Exception as e:
-        return str(e)
+        print(f"Error: {e}")
+        return None
+
+def pack_4bpp(image, width, height) -> bytes:
+    """Pack a PIL image into a 4bpp framebuffer for the LilyGO EPD47 driver.
+
+    Two pixels per byte, the left pixel in the low nibble. Odd widths get
+    one extra byte per row holding only the last pixel.
+    """
+    #source: https://github.com/Xinyuan-LilyGO/LilyGo-EPD47/blob/esp32s3/scripts/imgconvert.py
+    image = image.convert('L').resize((width, height), resample=Image.NEAREST)
+    pixels = np.asarray(image, dtype=np.uint8)
+    if width % 2:
+        pixels = np.pad(pixels, ((0, 0), (0, 1)))
+    return ((pixels[:, 0::2] >> 4) | (pixels[:, 1::2] & 0xF0)).tobytes()
 
 def convert_image_to_4bpp_bin(input_path, output_path, width, height):
+    """Convert an image file (or file-like object) to 4bpp data.
+
+    Returns the packed bytes; they are also written to output_path unless it is None.
+    """
     print(f"Processing: {input_path}")
     try:
-        image = Image.open(input_path).convert('L')
-        image = image.resize((width, height), resample=Image.NEAREST)
-
-        with open(output_path, 'wb') as f:
-            byte_count = 0
-            #source: https://github.com/Xinyuan-LilyGO/LilyGo-EPD47/blob/esp32s3/scripts/imgconvert.py
-            for y in range(0, height):
-                byte = 0
-                done = True
-                for x in range(0, width):
-                    l = image.getpixel((x, y))
-                    if x % 2 == 0:
-                        byte = l >> 4
-                        done = False
-                    else:
-                        byte |= l & 0xF0
-                        f.write(byte.to_bytes(1, 'big'))
-                        byte_count += 1
-                        done = True
-                if not done:
-                    f.write(byte.to_bytes(1, 'big'))
-            print(f"Bytes written: {byte_count} (expected: {(width*height)//2})")
+        with Image.open(input_path) as image:
+            data = pack_4bpp(image, width, height)
+
+        if output_path is not None:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+
+        print(f"Bytes written: {len(data)} (expected: {(width*height)//2})")
+        return data
     except Exception as e:
         print(f"Error: {e}")
+        return None
+
 
+# Display "type" from displays.json -> packer turning a PIL image into raw display data
+PACKERS = {
+    "1bpp": pack_1bpp,
+    "4bpp": pack_4bpp,
+}
 
+# Gray levels each packer keeps, Image widgets are dithered down to them
+PACKER_LEVELS = {
+    "1bpp": 2,
+    "4bpp": 16,
+}
+
+def _write_atomic(path, data: bytes):
+    # Concurrent requests for the same screen each write their own temp file,
+    # the rename makes sure readers never see a half-written artifact
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def render_screen_bin(screen, display, png_path=None, bin_path=None) -> bytes:
+    """Render a screen for a display entirely in memory and return the packed data.
+
+    png_path/bin_path are optional debug outputs of the transformed image and the packed data.
+    """
+    packer = PACKERS.get(display["type"])
+    if packer is None:
+        raise ValueError(f"Display type {display['type']} does not exist")
+
+    labels = {"screen": screen.get("id"), "display_type": display["type"]}
+    with RENDER_STAGE_DURATION.time(stage="render", **labels), request_timing.stage("render"):
+        canvas = render_display(
+            screen,
+            rotated=screen.get('isRotated', False),
+            levels=PACKER_LEVELS.get(display["type"]),
+            dither_method=display.get("dither")
+        )
+    with RENDER_STAGE_DURATION.time(stage="transform", **labels), request_timing.stage("transform"):
+        canvas = transform_canvas(
+            canvas,
+            screen.get('isRotated', False),
+            screen.get('flipX', False),
+            screen.get('flipY', False)
+        )
+    with RENDER_STAGE_DURATION.time(stage="pack", **labels), request_timing.stage("pack"):
+        data = packer(canvas, display["resolutionX"], display["resolutionY"])
+
+    with request_timing.stage("debug"):
+        if png_path is not None:
+            buf = io.BytesIO()
+            canvas.save(buf, format='PNG')
+            _write_atomic(png_path, buf.getvalue())
+        if bin_path is not None:
+            _write_atomic(bin_path, data)
+
+    return data
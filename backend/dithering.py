@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+METHODS = ("none", "bayer", "floyd-steinberg")
+DEFAULT_METHOD = "floyd-steinberg"
+
+# 8x8 Bayer index matrix, turned into thresholds in [0, 1)
+_BAYER_8 = np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+], dtype=np.float32)
+_BAYER_THRESHOLDS = (_BAYER_8 + 0.5) / 64
+
+
+def _gray_values(levels):
+    # Evenly spaced grays the packers keep exactly: 0/255 for 1bpp, multiples of 17 for 4bpp
+    return (np.arange(levels) * 255 // (levels - 1)).astype(np.uint8)
+
+
+def bayer(image, levels):
+    """Ordered dithering to `levels` evenly spaced grays, fully vectorized."""
+    gray = np.asarray(image.convert('L'), dtype=np.float32) * ((levels - 1) / 255)
+    h, w = gray.shape
+    thresholds = np.tile(_BAYER_THRESHOLDS, (h // 8 + 1, w // 8 + 1))[:h, :w]
+    idx = np.clip(np.floor(gray + thresholds), 0, levels - 1).astype(np.uint8)
+    return Image.fromarray(_gray_values(levels)[idx], mode='L')
+
+
+def floyd_steinberg(image, levels):
+    """Error diffusion to `levels` evenly spaced grays (done by Pillow's C quantizer)."""
+    if levels == 2:
+        return image.convert('L').convert('1').convert('L')
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([int(v) for v in _gray_values(levels) for _ in range(3)])
+    return image.convert('RGB').quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG).convert('L')
+
+
+def dither(image, levels, method=DEFAULT_METHOD):
+    """Reduce a PIL image to `levels` grays so the packer keeps every pixel as dithered."""
+    if method == "bayer":
+        return bayer(image, levels)
+    if method == "floyd-steinberg":
+        return floyd_steinberg(image, levels)
+    if method == "none":
+        return image
+    raise ValueError(f"Unknown dithering method {method}")
+
+
+class DitherCache:
+    """Small thread-safe LRU of dithered images.
+
+    Keys are chosen by the caller: a tuple starting with the uploaded filename,
+    followed by whatever identifies its version, size, target depth and method.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_dither(self, key, load, levels, method):
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+        result = dither(load(), levels, method)
+        with self._lock:
+            self._images[key] = result
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return result
+
+    def invalidate(self, filename):
+        """Drop entries whose key starts with filename."""
+        with self._lock:
+            for key in [k for k in self._images if k[0] == filename]:
+                del self._images[key]
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+
+DITHER_CACHE = DitherCache()
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+MAX_WORKERS = 4
+
+# status is "ok", "error" or "timeout"; late results are "ok" fetches that outlived their timeout
+FetchResult = namedtuple("FetchResult", ["uid", "status", "duration", "error"])
+
+
+class FetchExecutor:
+    """Runs due datasource fetches in parallel on a bounded thread pool.
+
+    Instances of a class with supports_batch are fetched together with one
+    cls.update_batch() call when several of them are due at once; every
+    other instance gets its own update_data() call.
+
+    Every fetch gets the source's get_fetch_timeout() (the longest one of a
+    batch). A fetch that is still queued at its deadline is cancelled; one
+    that is already running cannot be interrupted, so it is reported as
+    "timeout", its sources are not submitted again while it runs, and if it
+    finishes successfully it is handed out as late "ok" results by the next
+    run_due() call.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._late = []
+        self.last_results = {}  # uid -> FetchResult of its latest fetch
+
+    def _fetch(self, instances, force, started):
+        """Returns {uid: (updated or the exception it failed with, duration)}.
+
+        The start time goes into started["at"], so run_due() can time fetches
+        that fail or time out from when they actually began.
+        """
+        start = started["at"] = time.perf_counter()
+        try:
+            if len(instances) == 1:
+                outcomes = {instances[0].get_uid(): instances[0].update_data(force=force)}
+            else:
+                outcomes = type(instances[0]).update_batch(instances, force=force)
+            duration = time.perf_counter() - start
+            return {uid: (outcome, duration) for uid, outcome in outcomes.items()}
+        finally:
+            started["done"] = time.perf_counter()
+            with self._lock:
+                for instance in instances:
+                    self._in_flight.discard(instance.get_uid())
+
+    def _on_late_done(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            for uid, (outcome, duration) in future.result().items():
+                if outcome is True:
+                    self._late.append(FetchResult(uid, "ok", duration, None))
+
+    @staticmethod
+    def _elapsed(started):
+        """Seconds a fetch has been running (or ran), 0 if it never left the queue."""
+        if "at" not in started:
+            return 0.0
+        return started.get("done", time.perf_counter()) - started["at"]
+
+    @staticmethod
+    def _jobs(instances):
+        """Split {uid: instance} into lists fetched by one call each."""
+        batches = {}
+        jobs = []
+        for instance in instances.values():
+            if getattr(type(instance), "supports_batch", False):
+                batches.setdefault(type(instance), []).append(instance)
+            else:
+                jobs.append([instance])
+        jobs.extend(batches.values())
+        return jobs
+
+    def run_due(self, instances, force=False):
+        """Fetch every due instance of {uid: instance} and wait for them (up to their timeouts).
+
+        Returns {uid: FetchResult} for the sources that were fetched, including
+        late results of earlier timed-out fetches. Sources that were not due
+        are left out.
+        """
+        now = time.time()
+        futures = {}
+        starts = {}  # future -> {"at": perf_counter() when its fetch began running}
+        with self._lock:
+            results = {r.uid: r for r in self._late}
+            self._late.clear()
+            due = {
+                uid: instance for uid, instance in instances.items()
+                if uid not in self._in_flight and (force or instance.is_due(now))
+            }
+            for job in self._jobs(due):
+                self._in_flight.update(instance.get_uid() for instance in job)
+                started = {}
+                future = self._pool.submit(self._fetch, job, force, started)
+                futures[future] = job
+                starts[future] = started
+
+        start = time.monotonic()
+        deadlines = {f: start + max(i.get_fetch_timeout() for i in job) for f, job in futures.items()}
+        pending = set(futures)
+        while pending:
+            timeout = max(0.0, min(deadlines[f] for f in pending) - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is not None:
+                    duration = self._elapsed(starts[future])
+                    for instance in futures[future]:
+                        uid = instance.get_uid()
+                        results[uid] = FetchResult(uid, "error", duration, error)
+                    continue
+                for uid, (outcome, duration) in future.result().items():
+                    if isinstance(outcome, Exception):
+                        results[uid] = FetchResult(uid, "error", duration, outcome)
+                    elif outcome:
+                        results[uid] = FetchResult(uid, "ok", duration, None)
+
+            now_mono = time.monotonic()
+            for future in [f for f in pending if deadlines[f] <= now_mono]:
+                pending.discard(future)
+                uids = [instance.get_uid() for instance in futures[future]]
+                duration = self._elapsed(starts[future])
+                if future.cancel():
+                    with self._lock:
+                        self._in_flight.difference_update(uids)
+                else:
+                    future.add_done_callback(self._on_late_done)
+                for uid in uids:
+                    results[uid] = FetchResult(uid, "timeout", duration, TimeoutError(f"Fetch of UID {uid} timed out"))
+
+        with self._lock:
+            self.last_results.update(results)
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+UPLOADS_DIR = os.path.join("static", "uploads")
+
+
+def frame_key(screen, display):
+    """Hash of everything that changes the packed frame of a screen on a display.
+
+    Image widgets also contribute the mtime of their uploaded file, so
+    re-uploading a picture under the same name invalidates the frame.
+    """
+    widgets = screen.get("widgets", [])
+    mtimes = {}
+    for widget in widgets:
+        if widget.get("type") == "Image" and widget.get("filename"):
+            try:
+                mtimes[widget["filename"]] = os.stat(os.path.join(UPLOADS_DIR, widget["filename"])).st_mtime_ns
+            except OSError:
+                mtimes[widget["filename"]] = None
+
+    payload = {
+        "widgets": widgets,
+        "images": mtimes,
+        "size": [screen.get("resolutionX"), screen.get("resolutionY")],
+        "flags": [screen.get("isRotated", False), screen.get("flipX", False), screen.get("flipY", False)],
+        "display": [display.get("type"), display.get("resolutionX"), display.get("resolutionY"), display.get("dither")],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class FrameCache:
+    """Thread-safe LRU cache of packed frames keyed by frame_key().
+
+    Evicts the least recently used frames once either max_entries or
+    max_bytes is exceeded.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()  # key -> (etag, data)
+        self._etags = {}  # etag -> key, to find frames a device already has
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (etag, data) for key or None, counting the hit/miss."""
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, data: bytes):
+        """Store a packed frame and return its ETag (hash of the frame bytes)."""
+        etag = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+                self._forget_etag(old[0], key)
+            self._frames[key] = (etag, data)
+            self._etags[etag] = key
+            self._bytes += len(data)
+
+            while self._frames and (len(self._frames) > self.max_entries or self._bytes > self.max_bytes):
+                evicted_key, (evicted_etag, evicted) = self._frames.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._forget_etag(evicted_etag, evicted_key)
+                self.evictions += 1
+        return etag
+
+    def _forget_etag(self, etag, key):
+        # Identical frames of different keys share an ETag, only drop it if it points at key
+        if self._etags.get(etag) == key:
+            del self._etags[etag]
+
+    def find_etag(self, etag):
+        """Return the cached frame with this ETag or None (not counted as hit/miss)."""
+        with self._lock:
+            key = self._etags.get(etag)
+            if key is None:
+                return None
+            return self._frames[key][1]
+
+    def get_or_render(self, screen, display, render):
+        """Return (etag, data) of the frame, calling render(screen, display) only on a miss."""
+        key = frame_key(screen, display)
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        data = render(screen, display)
+        return self.put(key, data), data
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._etags.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._frames),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by the Flask threads serving devices
+FRAME_CACHE = FrameCache()
@@ -0,0 +1,86 @@
+"""Run-length transfer encoding for packed frames.
+
+Uses the PackBits scheme, which a microcontroller can decode while the bytes
+arrive, without any window or buffer besides the output frame:
+
+    header n in 0..127     copy the next n + 1 bytes literally
+    header n in 129..255   repeat the next byte 257 - n times
+    header 128             no-op
+"""
+import numpy as np
+
+# Runs shorter than this are cheaper to send as part of a literal packet
+MIN_RUN = 3
+MAX_PACKET = 128
+
+ENCODINGS = ("rle",)
+
+
+def rle_encode(data: bytes) -> bytes:
+    if not data:
+        return b""
+
+    arr = np.frombuffer(data, dtype=np.uint8)
+    # Start offsets and lengths of runs of equal bytes
+    starts = np.concatenate(([0], np.flatnonzero(arr[1:] != arr[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(arr)))
+
+    out = bytearray()
+    literal_start = None
+
+    def flush_literal(end):
+        for i in range(literal_start, end, MAX_PACKET):
+            chunk = data[i:min(i + MAX_PACKET, end)]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+
+    for start, length in zip(starts.tolist(), lengths.tolist()):
+        if length < MIN_RUN:
+            if literal_start is None:
+                literal_start = start
+            continue
+        if literal_start is not None:
+            flush_literal(start)
+            literal_start = None
+        value = data[start]
+        end = start + length
+        while length >= MIN_RUN:
+            n = min(length, MAX_PACKET)
+            out.append(257 - n)
+            out.append(value)
+            length -= n
+        if length:
+            # 1-2 bytes left after splitting a long run start the next literal
+            literal_start = end - length
+
+    if literal_start is not None:
+        flush_literal(len(data))
+    return bytes(out)
+
+
+def rle_decode(payload: bytes) -> bytes:
+    """Reference decoder, written the way the firmware would stream it."""
+    out = bytearray()
+    i = 0
+    while i < len(payload):
+        n = payload[i]
+        i += 1
+        if n < 128:
+            out += payload[i:i + n + 1]
+            i += n + 1
+        elif n > 128:
+            out += bytes([payload[i]]) * (257 - n)
+            i += 1
+    return bytes(out)
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    if encoding == "rle":
+        return rle_encode(data)
+    raise ValueError(f"Unknown frame encoding {encoding}")
+
+
+def decode(payload: bytes, encoding: str) -> bytes:
+    if encoding == "rle":
+        return rle_decode(payload)
+    raise ValueError(f"Unknown frame encoding {encoding}")
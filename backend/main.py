@@ -1,9 +1,20 @@
 from flask import Flask, jsonify, request, send_file, make_response, abort, Response, current_app
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException, InternalServerError
 import os
 import controller as controller
 import display as dsp
+from frame_cache import FRAME_CACHE
+import delta_frames
+import prerender
+import frame_codec
+from asset_cache import ASSET_CACHE
+from dithering import DITHER_CACHE
+import metrics
+import state_store
+import request_timing
+from datasets.DPMB import dpmb
 import unicodedata
 import tempfile
 import subprocess
@@ -17,8 +28,16 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = -1
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Keep the last rendered PNG/.bin of every screen in ./displays for debugging
+SAVE_DEBUG_ARTIFACTS = os.getenv("SAVE_DEBUG_ARTIFACTS", "0") == "1"
+
 CORS(app, resources={r"/*":{'origins':"*"}})
 
+# Re-render screens as soon as their widget values change, not when the device wakes up
+controller.SCREEN_UPDATE_LISTENERS.append(
+    lambda screens: prerender.prerender_screens(screens, controller.get_display_by_id)
+)
+
 @app.route('/api/get-screens', methods=['GET'])
 def get_screens():
     try:
@@ -118,6 +137,12 @@ def delete_datasource(uid):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    # 503 while data sources are still warming up after a restart
+    states = controller.get_source_states()
+    return jsonify(states), 200 if states["ready"] else 503
+
 @app.route('/api/refresh-datasource/<int:uid>', methods=['GET'])
 def refresh_datasource(uid):
     try:
@@ -148,53 +173,133 @@ def update_screen_widgets(uid):
 
 @app.route('/api/get-screen-picture-bin/<int:s_id>/<int:d_id>', methods=['GET'])
 def get_screen_picture(s_id, d_id):
+    with request_timing.timed_request("get-screen-picture-bin") as timer:
+        response = _get_screen_picture(s_id, d_id, timer)
+    response.headers['Server-Timing'] = timer.header()
+    return response
+
+def _get_screen_picture(s_id, d_id, timer):
     try:
         # Load display from controller
-        screen = controller.get_screen_by_id(s_id)
-        display = controller.get_display_by_id(d_id)
-        output_h_path = f"./displays/bin_files/screen_{s_id}.bin"
-        output_png_path = f"./displays/pictures/screen_{s_id}.png"
+        with timer.stage("lookup"):
+            screen = controller.get_screen_by_id(s_id)
+            display = controller.get_display_by_id(d_id)
 
         if not screen:
             abort(404, description="Screen not found")
+        prerender.note_served(s_id, d_id)
+
+        # Render, transform and pack in memory, files are only written for debugging
+        png_path = bin_path = None
+        if SAVE_DEBUG_ARTIFACTS:
+            png_path = f"./displays/pictures/screen_{s_id}.png"
+            bin_path = f"./displays/bin_files/screen_{s_id}.bin"
+
+        def render(s, d):
+            timer.note("frame", "miss")
+            return dsp.render_screen_bin(s, d, png_path, bin_path)
+
+        # Unchanged screens are served from the frame cache, and not at all if the device already has them
+        timer.note("frame", "hit")
+        with timer.stage("frame"):
+            etag, bin_data = FRAME_CACHE.get_or_render(screen, display, render)
+
+        # Opt-in compressed transfer, the encoded body gets its own ETag
+        encoding = request.args.get('encoding') or request.headers.get('X-Frame-Encoding')
+        headers = {}
+        if encoding:
+            if encoding not in frame_codec.ENCODINGS:
+                abort(400, description=f"Unknown frame encoding {encoding}")
+            etag = f"{etag}-{encoding}"
+            headers['X-Frame-Encoding'] = encoding
+            headers['X-Frame-Length'] = str(len(bin_data))
+
+        if request.if_none_match.contains(etag):
+            metrics.SERVED_BYTES.observe(0, endpoint="bin", display_type=display["type"])
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        if encoding:
+            with timer.stage("encode"):
+                bin_data = frame_codec.encode(bin_data, encoding)
+        metrics.SERVED_BYTES.observe(len(bin_data), endpoint="bin", display_type=display["type"])
+
+        headers['Content-Length'] = str(len(bin_data))
+        headers['ETag'] = f'"{etag}"'
+        return Response(
+            bin_data,
+            mimetype='application/octet-stream',
+            headers=headers
+        )
 
-        # Render PNG from widgets
-        dsp.render_display(screen, output_png_path, screen.get('isRotated', False))
+    except HTTPException as e:
+        return e.get_response()
+    except Exception as e:
+        print(f"Error in API: {e}")
+        return InternalServerError(description="Failed to generate screen picture").get_response()
+
+@app.route('/api/get-screen-picture-delta/<int:s_id>/<int:d_id>', methods=['GET'])
+def get_screen_picture_delta(s_id, d_id):
+    """Like get-screen-picture-bin, but encoded as a delta to the frame the device shows.
+
+    The device passes the ETag of its current frame as ?base=<etag>. The body is a
+    delta_frames payload (full frame if the base is unknown or the delta is too big).
+    """
+    try:
+        screen = controller.get_screen_by_id(s_id)
+        display = controller.get_display_by_id(d_id)
+        prerender.note_served(s_id, d_id)
+
+        etag, bin_data = FRAME_CACHE.get_or_render(screen, display, dsp.render_screen_bin)
+        base_etag = request.args.get('base', '').strip('"')
+        if base_etag == etag:
+            metrics.SERVED_BYTES.observe(0, endpoint="delta", display_type=display["type"])
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        threshold = request.args.get('threshold', delta_frames.DEFAULT_THRESHOLD, type=float)
+        base = FRAME_CACHE.find_etag(base_etag) if base_etag else None
+        payload = delta_frames.encode_delta(base, bin_data, display["resolutionY"], threshold)
+        metrics.SERVED_BYTES.observe(len(payload), endpoint="delta", display_type=display["type"])
 
-        raw_png = open(output_png_path, 'rb').read()
-        proc_png = dsp.transform_image(
-            raw_png,
-            screen.get('isRotated', False),
-            screen.get('flipX', False),
-            screen.get('flipY', False)
-        )
-        # overwrite
-        with open(output_png_path, 'wb') as f:
-            f.write(proc_png)
-
-        # USER has to add functionality to convert the image to the correct format
-        # Convert PNG to bin (raw data only)
-        match display["type"]:
-            case "1bpp":
-                dsp.convert_image_to_1bpp_bin(output_png_path, output_h_path, display["resolutionX"], display["resolutionY"])
-            case "4bpp":
-                dsp.convert_image_to_4bpp_bin(output_png_path, output_h_path, display["resolutionX"], display["resolutionY"])
-            case _:
-                RuntimeError("Display type does not exist")
-                abort(500, description="Failed to generate screen picture")
-
-
-        bin_data = open(output_h_path, 'rb').read()
         return Response(
-            bin_data,
+            payload,
             mimetype='application/octet-stream',
-            headers={'Content-Length': str(len(bin_data))}
+            headers={
+                'Content-Length': str(len(payload)),
+                'ETag': f'"{etag}"',
+                'X-Frame-Kind': 'delta' if payload[:1] == delta_frames.KIND_DELTA else 'full'
+            }
         )
 
     except Exception as e:
         print(f"Error in API: {e}")
         abort(500, description="Failed to generate screen picture")
 
+@app.route('/api/frame-cache-stats', methods=['GET'])
+def frame_cache_stats():
+    return jsonify(FRAME_CACHE.stats())
+
+@app.route('/api/profiling', methods=['GET', 'POST'])
+def profiling():
+    # POST {"every": N} to profile every Nth render request from now on, 0 turns it off
+    if request.method == 'POST':
+        every = (request.get_json(silent=True) or {}).get('every')
+        if not isinstance(every, int) or every < 0:
+            return jsonify({'error': "'every' must be a non-negative integer"}), 400
+        request_timing.PROFILER.every = every
+    return jsonify({
+        'every': request_timing.PROFILER.every,
+        'directory': request_timing.PROFILER.directory,
+        'profiles': request_timing.PROFILER.dumps()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/gtfs-feed-stats', methods=['GET'])
+def gtfs_feed_stats():
+    return jsonify({**dpmb.FEED_CACHE.stats(), "updater": dpmb.FEED_UPDATER.status()})
+
 @app.route('/api/get-sleep/<int:id>', methods=['GET'])
 def get_sleep_time(id):
     return str(controller.get_sleep_display(id)), 200, {'Content-Type': 'text/plain'}
@@ -213,6 +318,8 @@ def upload_image():
     filepath = os.path.join(UPLOAD_FOLDER, filename)
     print(filepath)
     file.save(dst=filepath)
+    ASSET_CACHE.invalidate(filename)
+    DITHER_CACHE.invalidate(filename)
 
 
     public_url = f'./static/uploads/{filename}'
@@ -240,6 +347,8 @@ def delete_uploaded_image(filename):
 
     if os.path.exists(filepath):
         os.remove(filepath)
+        ASSET_CACHE.invalidate(filename)
+        DITHER_CACHE.invalidate(filename)
         return jsonify({'ok': 'All good'}), 200
     else:
         return jsonify({'error': 'file does not exist'}), 400
@@ -547,23 +656,31 @@ def list_fonts_json():
 
 @app.route('/api/render-screen-image/<int:screen_id>', methods=['GET'])
 def render_screen_image(screen_id):
-
-    screen_data = controller.get_screen_by_id(screen_id)
-
-    # render into an in-memory buffer
-    buf = BytesIO()
-    dsp.render_display(screen_data, output_path=buf, rotated=screen_data.get('isRotated', False))
-    buf.seek(0)
-
-    # return as PNG
-    return send_file(
-        buf,
-        mimetype='image/png',
-        as_attachment=False,
-        download_name=f'screen_{screen_id}.png'
-    )
+    with request_timing.timed_request("render-screen-image") as timer:
+        with timer.stage("lookup"):
+            screen_data = controller.get_screen_by_id(screen_id)
+
+        # render into an in-memory buffer
+        with timer.stage("render"):
+            canvas = dsp.render_display(screen_data, rotated=screen_data.get('isRotated', False))
+        buf = BytesIO()
+        with timer.stage("png"):
+            canvas.save(buf, format='PNG')
+        buf.seek(0)
+
+        # return as PNG
+        response = send_file(
+            buf,
+            mimetype='image/png',
+            as_attachment=False,
+            download_name=f'screen_{screen_id}.png'
+        )
+    response.headers['Server-Timing'] = timer.header()
+    return response
 
 if __name__ == "__main__":
+    # docker stop sends SIGTERM, write pending store changes before going down
+    state_store.install_signal_handlers()
     controller.initialize_instances_from_file()
     controller.start_auto_refresh()
     app.run(host="0.0.0.0", port=5000, use_reloader=False) #
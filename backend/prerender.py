@@ -0,0 +1,35 @@
+import threading
+
+import display as dsp
+from frame_cache import FRAME_CACHE
+
+# screen id -> ids of the displays that fetched it, so we know which profiles to pre-render
+_SERVED_DISPLAYS = {}
+_lock = threading.Lock()
+
+
+def note_served(screen_id, display_id):
+    """Remember that a device of display_id shows screen_id."""
+    with _lock:
+        _SERVED_DISPLAYS.setdefault(screen_id, set()).add(display_id)
+
+
+def served_displays(screen_id):
+    with _lock:
+        return set(_SERVED_DISPLAYS.get(screen_id, ()))
+
+
+def prerender_screens(screens, get_display):
+    """Render and pack the given screens for every display profile they are served to.
+
+    The frames land in FRAME_CACHE under the same key the device endpoint
+    computes, so the next wake of those devices is a cache hit.
+    """
+    for screen in screens:
+        for display_id in served_displays(screen.get("id")):
+            try:
+                display = get_display(display_id)
+                FRAME_CACHE.get_or_render(screen, display, dsp.render_screen_bin)
+                print(f"[Pre-render] Screen {screen.get('id')} ready for display {display_id}")
+            except Exception as e:
+                print(f"[Pre-render] Failed for screen {screen.get('id')} on display {display_id}: {e}")
@@ -0,0 +1,81 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Spread refreshes of sources with the same interval by up to +-5 % of the interval
+JITTER_FRACTION = 0.05
+
+
+class RefreshScheduler:
+    """Priority queue of datasource uids ordered by their next due time.
+
+    The refresh loop blocks in wait_due() until the earliest deadline passes;
+    schedule(), remove() and wake() wake it early so it can recompute how long
+    to sleep.
+    """
+
+    def __init__(self, jitter=JITTER_FRACTION):
+        self.jitter = jitter
+        self._heap = []   # (due, seq, uid), stale entries are skipped lazily
+        self._due = {}    # uid -> due time of its live heap entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def schedule(self, uid, due):
+        with self._cond:
+            self._due[uid] = due
+            heapq.heappush(self._heap, (due, next(self._seq), uid))
+            self._cond.notify_all()
+
+    def schedule_after(self, uid, last_updated, interval):
+        """Schedule uid one interval after last_updated, with jitter."""
+        offset = random.uniform(-self.jitter, self.jitter) * interval if self.jitter else 0
+        self.schedule(uid, last_updated + interval + offset)
+
+    def remove(self, uid):
+        with self._cond:
+            self._due.pop(uid, None)
+            self._cond.notify_all()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def next_due(self, uid):
+        with self._cond:
+            return self._due.get(uid)
+
+    def _pop_stale(self):
+        while self._heap:
+            due, _, uid = self._heap[0]
+            if self._due.get(uid) == due:
+                return
+            heapq.heappop(self._heap)
+
+    def wait_due(self, timeout=None):
+        """Block until at least one uid is due (or timeout/wake) and return the due uids.
+
+        Returned uids are taken off the schedule; the caller reschedules them
+        after fetching.
+        """
+        with self._cond:
+            self._pop_stale()
+            now = time.time()
+            if not self._heap or self._heap[0][0] > now:
+                delay = self._heap[0][0] - now if self._heap else None
+                if timeout is not None:
+                    delay = timeout if delay is None else min(delay, timeout)
+                self._cond.wait(delay)
+                self._pop_stale()
+
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, _, uid = heapq.heappop(self._heap)
+                if uid in self._due:
+                    del self._due[uid]
+                    due.append(uid)
+                self._pop_stale()
+            return due
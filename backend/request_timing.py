@@ -0,0 +1,135 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Profile every Nth timed request with cProfile (0 = off), dumps go to PROFILE_DIR
+PROFILE_EVERY = int(os.getenv("PROFILE_EVERY", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+
+_local = threading.local()
+
+
+class StageTimer:
+    """Durations of the stages of one request, rendered as a Server-Timing header.
+
+    A stage entered several times (e.g. font lookups per widget) is summed.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._stages = {}  # name -> seconds, in first-entered order
+        self._descs = {}
+
+    @contextmanager
+    def stage(self, name):
+        self._stages.setdefault(name, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + time.perf_counter() - start
+
+    def note(self, name, desc):
+        self._descs[name] = desc
+
+    def header(self):
+        parts = []
+        for name, seconds in self._stages.items():
+            desc = f';desc="{self._descs[name]}"' if name in self._descs else ""
+            parts.append(f"{name};dur={seconds * 1000:.2f}{desc}")
+        parts += [f'{name};desc="{desc}"' for name, desc in self._descs.items() if name not in self._stages]
+        parts.append(f"total;dur={(time.perf_counter() - self._start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def current():
+    """The timer of the request handled by this thread, or None."""
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current request, no-op outside timed requests (e.g. pre-rendering)."""
+    timer = current()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+class SamplingProfiler:
+    """Runs cProfile on every Nth request and dumps the stats to a directory.
+
+    Only the thread handling the sampled request is profiled. Open a dump
+    with `python -m pstats <file>` or snakeviz.
+    """
+
+    def __init__(self, every=PROFILE_EVERY, directory=PROFILE_DIR):
+        self.every = every
+        self.directory = directory
+        self._count = 0
+        self._lock = threading.Lock()
+        self._active = False  # cProfile can not profile two requests at once
+
+    def _should_sample(self):
+        with self._lock:
+            if self.every <= 0 or self._active:
+                return False
+            self._count += 1
+            if self._count % self.every:
+                return False
+            self._active = True
+            return True
+
+    @contextmanager
+    def sample(self, name):
+        if not self._should_sample():
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is running in this process
+            with self._lock:
+                self._active = False
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profiler.disable()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{self._count}.prof")
+                profiler.dump_stats(path)
+                print(f"[Profiler] Saved {path}")
+            except Exception as e:
+                print(f"[Profiler] Failed to save profile: {e}")
+            finally:
+                with self._lock:
+                    self._active = False
+
+    def dumps(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(f for f in os.listdir(self.directory) if f.endswith(".prof"))
+
+
+PROFILER = SamplingProfiler()
+
+
+@contextmanager
+def timed_request(name):
+    """Collect stage timings for the request handled by this thread (and maybe profile it)."""
+    timer = StageTimer()
+    _local.timer = timer
+    try:
+        with PROFILER.sample(name):
+            yield timer
+    finally:
+        _local.timer = None
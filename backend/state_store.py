@@ -0,0 +1,191 @@
+import atexit
+import copy
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import STORE_FLUSH_DURATION
+
+# Seconds to wait after a change before writing the file, changes in between are coalesced
+WRITE_BEHIND_DELAY = 0.5
+
+
+class JsonStore:
+    """In-memory collection of JSON records indexed by id, persisted to a JSON file.
+
+    The file is read once; every change is applied in memory and written back
+    behind the caller (temp file + rename, so the file is never half written).
+
+    Records handed out by get()/all() are shared between threads and must be
+    treated as read-only. Changes go through put(), update() and delete(),
+    which replace whole records, so readers always see a consistent record.
+    Several changes can be grouped in transaction(), which holds the store
+    lock and schedules a single write at the end.
+    """
+
+    def __init__(self, path, key="id", sort=False, delay=WRITE_BEHIND_DELAY):
+        self.path = path
+        self.key = key
+        self.sort = sort
+        self.delay = delay
+        self.version = 0
+        self.writes = 0
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # keeps snapshots hitting the disk in order
+        self._records = {}
+        self._depth = 0
+        self._dirty = False
+        self._timer = None
+        self._load()
+        _STORES.append(self)
+
+    def _load(self):
+        data = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        if not isinstance(data, list):
+            # Files created by the old load_json() default can hold {} instead of []
+            print(f"[Store] {self.path} does not contain a list, starting empty")
+            data = []
+        self._records = {item.get(self.key): item for item in data if isinstance(item, dict)}
+
+    # Reading
+    def all(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def get(self, record_id):
+        return self._records.get(record_id)
+
+    def ids(self):
+        with self._lock:
+            return set(self._records)
+
+    # Writing
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._dirty:
+                    self._schedule_write()
+
+    def next_id(self):
+        with self._lock:
+            new_id = 1
+            while new_id in self._records:
+                new_id += 1
+            return new_id
+
+    def put(self, record):
+        """Insert or replace a record, the store takes ownership of it."""
+        with self.transaction():
+            self._records[record.get(self.key)] = record
+            self._changed()
+        return record
+
+    def update(self, record_id, changes):
+        """Replace a record by a copy with changes applied.
+
+        changes is either a dict merged into the record or a function that
+        mutates the (private) copy in place.
+        """
+        with self.transaction():
+            if record_id not in self._records:
+                raise KeyError(record_id)
+            record = copy.deepcopy(self._records[record_id])
+            if callable(changes):
+                changes(record)
+            else:
+                record.update(changes)
+            self._records[record_id] = record
+            self._changed()
+            return record
+
+    def delete(self, record_id):
+        with self.transaction():
+            removed = self._records.pop(record_id, None)
+            if removed is not None:
+                self._changed()
+            return removed
+
+    def _changed(self):
+        self.version += 1
+        self._dirty = True
+
+    # Persistence
+    def _schedule_write(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write the current state to disk now if anything changed."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                records = list(self._records.values())
+                if self.sort:
+                    records.sort(key=lambda x: x.get(self.key, float("inf")))
+                self._dirty = False
+                self.writes += 1
+
+            directory = os.path.dirname(self.path) or "."
+            start = time.perf_counter()
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(records, f, ensure_ascii=False, indent=4)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.remove(tmp_path)
+                with self._lock:
+                    self._dirty = True
+                raise
+            STORE_FLUSH_DURATION.observe(time.perf_counter() - start, file=os.path.basename(self.path))
+
+
+_STORES = []
+
+
+@atexit.register
+def flush_all():
+    for store in _STORES:
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"[Store] Failed to write {store.path}: {e}")
+
+
+def install_signal_handlers():
+    """Flush the stores on SIGTERM/SIGINT too, atexit handlers don't run when a signal kills the process.
+
+    Must be called from the main thread. The previous handler still runs
+    afterwards (SIGINT keeps raising KeyboardInterrupt); where there was
+    none, the process exits.
+    """
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(signum)
+
+        def handler(signum, frame, previous=previous):
+            flush_all()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                sys.exit(128 + signum)
+
+        signal.signal(signum, handler)
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# The backend runs from its own directory and opens data/ and static/ relative to it
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import controller
+from binding_index import BindingIndex
+from datasets.datasource_base import DataSource
+from refresh_scheduler import RefreshScheduler
+from state_store import JsonStore
+
+FONT = "Montserrat"
+
+
+@pytest.fixture
+def ctl(tmp_path, monkeypatch):
+    """The controller module, pointed at empty stores in tmp_path so data/ is left alone.
+
+    Registries, scheduler, warm-up states and update listeners are fresh
+    too. The write-behind delay is long, so only explicit flushes hit the
+    disk during a test.
+    """
+    def store(name, key, sort=False):
+        return JsonStore(str(tmp_path / f"{name}.json"), key=key, sort=sort, delay=3600)
+
+    monkeypatch.setattr(controller, "SCREENS", store("screens", "id"))
+    monkeypatch.setattr(controller, "DISPLAYS", store("displays", "id"))
+    monkeypatch.setattr(controller, "DATASOURCES", store("datasources", "uid", sort=True))
+    monkeypatch.setattr(controller, "BINDINGS", BindingIndex())
+    monkeypatch.setattr(controller, "INSTANCE_REGISTRY", {})
+    monkeypatch.setattr(controller, "SCHEDULER", RefreshScheduler())
+    monkeypatch.setattr(controller, "SOURCE_STATES", {})
+    monkeypatch.setattr(controller, "SCREEN_UPDATE_LISTENERS", [])
+    return controller
+
+
+def make_screen(screen_id, widgets, width=122, height=250):
+    return {"id": screen_id, "name": f"Screen {screen_id}", "resolutionX": width, "resolutionY": height,
+            "widgets": widgets}
+
+
+def text_widget(text, x=4, y=4, **extra):
+    return {"type": "StaticText", "text": text, "x": x, "y": y, "fontSize": 14, "fontFamily": FONT, **extra}
+
+
+def value_widget(uid, y=30):
+    return {"type": "ValueText", "value": None, "sourceUid": uid, "fieldName": "value", "x": 4, "y": y,
+            "fontSize": 14, "fontFamily": FONT}
+
+
+class FakeSource(DataSource):
+    """Source whose fetch returns inputs["value"]."""
+
+    def fetch_data(self):
+        self.cached_data = {"value": self.inputs["value"]}
+
+    def get_data(self):
+        return {"value": {"value": (self.cached_data or {}).get("value"), "type": "number"}}
+
+    def get_update_interval(self):
+        return 60
+
+    def get_name(self):
+        return f"Fake {self.uid}"
@@ -0,0 +1,63 @@
+import json
+
+from conftest import FakeSource, make_screen, text_widget, value_widget
+from fetch_executor import FetchResult
+
+
+def test_tick_writes_each_store_once(ctl):
+    for uid in (1, 2, 3, 4):
+        ctl.DATASOURCES.put({"uid": uid, "source": "Fake", "inputs": {"value": uid * 10}, "data": {"value": 0}})
+        instance = FakeSource({"value": uid * 10}, uid)
+        instance.fetch_data()
+        ctl.INSTANCE_REGISTRY[uid] = instance
+
+    ctl.SCREENS.put(make_screen(1, [value_widget(1), value_widget(2, y=60)]))
+    ctl.SCREENS.put(make_screen(2, [value_widget(2), value_widget(3, y=60), value_widget(1, y=90)]))
+    ctl.SCREENS.put(make_screen(3, [value_widget(3)]))
+    ctl.SCREENS.put(make_screen(4, [text_widget("not bound")]))
+    ctl.BINDINGS.rebuild(ctl.SCREENS.all())
+    ctl.DATASOURCES.flush()
+    ctl.SCREENS.flush()
+    source_writes, screen_writes = ctl.DATASOURCES.writes, ctl.SCREENS.writes
+
+    announced = []
+    ctl.SCREEN_UPDATE_LISTENERS.append(announced.append)
+
+    ctl._commit_tick({
+        1: FetchResult(1, "ok", 0.1, None),
+        2: FetchResult(2, "ok", 0.1, None),
+        3: FetchResult(3, "ok", 0.1, None),
+        4: FetchResult(4, "error", 0.1, RuntimeError("down")),
+    })
+
+    assert ctl.DATASOURCES.writes - source_writes == 1
+    assert ctl.SCREENS.writes - screen_writes == 1
+
+    # One announcement with every patched screen once, in its final state
+    assert len(announced) == 1
+    screens = {screen["id"]: screen for screen in announced[0]}
+    assert len(announced[0]) == len(screens)
+    assert set(screens) == {1, 2, 3}
+    assert [w["value"] for w in screens[1]["widgets"]] == [10, 20]
+    assert [w["value"] for w in screens[2]["widgets"]] == [20, 30, 10]
+    assert [w["value"] for w in screens[3]["widgets"]] == [30]
+
+    with open(ctl.DATASOURCES.path, encoding="utf-8") as f:
+        saved = {item["uid"]: item["data"] for item in json.load(f)}
+    assert saved == {1: {"value": 10}, 2: {"value": 20}, 3: {"value": 30}, 4: {"value": 0}}
+    with open(ctl.SCREENS.path, encoding="utf-8") as f:
+        saved = {item["id"]: item for item in json.load(f)}
+    assert saved[2] == screens[2]
+
+
+def test_tick_without_changes_writes_nothing(ctl):
+    ctl.DATASOURCES.put({"uid": 1, "source": "Fake", "inputs": {"value": 1}, "data": {}})
+    ctl.DATASOURCES.flush()
+    announced = []
+    ctl.SCREEN_UPDATE_LISTENERS.append(announced.append)
+
+    ctl._commit_tick({1: FetchResult(1, "timeout", 30.0, TimeoutError("slow"))})
+
+    assert ctl.DATASOURCES.writes == 1
+    assert ctl.SCREENS.writes == 0
+    assert announced == []
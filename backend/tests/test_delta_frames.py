@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import delta_frames
+from conftest import make_screen, text_widget
+from frame_cache import FRAME_CACHE
+
+
+def random_frame(rng, rows, stride):
+    return rng.integers(0, 256, size=rows * stride, dtype=np.uint8).tobytes()
+
+
+def change_rects(rng, frame, rows, stride, count):
+    """frame with count random rectangles overwritten."""
+    out = np.frombuffer(frame, dtype=np.uint8).reshape(rows, stride).copy()
+    for _ in range(count):
+        y, x = int(rng.integers(0, rows)), int(rng.integers(0, stride))
+        h, w = int(rng.integers(1, rows - y + 1)), int(rng.integers(1, stride - x + 1))
+        out[y:y + h, x:x + w] = rng.integers(0, 256, size=(h, w), dtype=np.uint8)
+    return out.tobytes()
+
+
+@pytest.mark.parametrize("rows, stride", [(250, 16), (540, 480), (7, 3), (1, 1)])
+def test_round_trip_random_frames(rows, stride):
+    rng = np.random.default_rng(rows * 1000 + stride)
+    for _ in range(20):
+        base = random_frame(rng, rows, stride)
+        new = change_rects(rng, base, rows, stride, int(rng.integers(0, 5)))
+        for threshold in (0.0, 0.5, 1.0, 10.0):
+            payload = delta_frames.encode_delta(base, new, rows, threshold)
+            assert delta_frames.apply_delta(base, payload) == new
+
+
+def test_small_change_is_sent_as_delta():
+    rows, stride = 250, 16
+    base = bytes(rows * stride)
+    new = bytearray(base)
+    new[100 * stride + 3] = 0xFF
+    payload = delta_frames.encode_delta(base, bytes(new), rows)
+    assert payload[:1] == delta_frames.KIND_DELTA
+    assert len(payload) < len(new) // 10
+    assert delta_frames.dirty_rects(base, bytes(new), rows) == [(3, 100, 1, 1)]
+
+
+def test_unchanged_frame_is_an_empty_delta():
+    rows, stride = 250, 16
+    frame = random_frame(np.random.default_rng(0), rows, stride)
+    payload = delta_frames.encode_delta(frame, frame, rows)
+    assert payload[:1] == delta_frames.KIND_DELTA
+    assert delta_frames.apply_delta(frame, payload) == frame
+
+
+def test_full_frame_when_delta_exceeds_threshold():
+    rng = np.random.default_rng(1)
+    rows, stride = 250, 16
+    base, new = random_frame(rng, rows, stride), random_frame(rng, rows, stride)
+    payload = delta_frames.encode_delta(base, new, rows, threshold=0.5)
+    assert payload == delta_frames.KIND_FULL + new
+
+    # The same change fits under a looser threshold
+    payload = delta_frames.encode_delta(base, new, rows, threshold=2.0)
+    assert payload[:1] == delta_frames.KIND_DELTA
+    assert delta_frames.apply_delta(base, payload) == new
+
+
+@pytest.mark.parametrize("base", [None, b"", bytes(10)])
+def test_full_frame_without_a_usable_base(base):
+    new = random_frame(np.random.default_rng(2), 250, 16)
+    payload = delta_frames.encode_delta(base, new, 250)
+    assert payload == delta_frames.KIND_FULL + new
+    assert delta_frames.apply_delta(base, payload) == new
+
+
+def test_decoder_rejects_mismatched_base_and_unknown_kind():
+    rng = np.random.default_rng(3)
+    base = random_frame(rng, 250, 16)
+    new = change_rects(rng, base, 250, 16, 1)
+    payload = delta_frames.encode_delta(base, new, 250, threshold=10.0)
+    assert payload[:1] == delta_frames.KIND_DELTA
+    with pytest.raises(ValueError):
+        delta_frames.apply_delta(base[:-16], payload)
+    with pytest.raises(ValueError):
+        delta_frames.apply_delta(None, payload)
+    with pytest.raises(ValueError):
+        delta_frames.apply_delta(base, b"X" + new)
+
+
+@pytest.fixture
+def client(ctl):
+    import main
+    FRAME_CACHE.clear()
+    ctl.DISPLAYS.put({"id": 1, "name": "test", "type": "1bpp", "resolutionX": 122, "resolutionY": 250})
+    ctl.SCREENS.put(make_screen(1, [text_widget("Hello")]))
+    yield main.app.test_client()
+    FRAME_CACHE.clear()
+
+
+def test_endpoint_not_modified_for_current_base(client):
+    url = "/api/get-screen-picture-delta/1/1"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["X-Frame-Kind"] == "full"
+    etag = first.headers["ETag"]
+
+    again = client.get(url, query_string={"base": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_endpoint_delta_against_previous_frame(client, ctl):
+    url = "/api/get-screen-picture-delta/1/1"
+    first = client.get(url)
+    old_frame = first.data[1:]
+
+    ctl.SCREENS.put(make_screen(1, [text_widget("Hello"), text_widget("World", y=200)]))
+    response = client.get(url, query_string={"base": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["X-Frame-Kind"] == "delta"
+    assert response.headers["ETag"] != first.headers["ETag"]
+
+    full = client.get("/api/get-screen-picture-bin/1/1").data
+    assert delta_frames.apply_delta(old_frame, response.data) == full
+
+
+def test_endpoint_full_frame_for_unknown_base(client):
+    response = client.get("/api/get-screen-picture-delta/1/1", query_string={"base": '"no-such-frame"'})
+    assert response.status_code == 200
+    assert response.headers["X-Frame-Kind"] == "full"
+    assert response.data == delta_frames.KIND_FULL + client.get("/api/get-screen-picture-bin/1/1").data
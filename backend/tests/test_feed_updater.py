@@ -0,0 +1,193 @@
+import hashlib
+import http.server
+import os
+import threading
+import zipfile
+
+import pytest
+
+from benchmarks import synthetic_gtfs
+from datasets.DPMB import gtfs_columnar
+from datasets.DPMB.feed_updater import FeedUpdater
+
+
+class FeedServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for the GTFS download, serving body with optional validators."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FeedHandler)
+        self._body = b""
+        self.versions = 0
+        self.etag = True
+        self.last_modified = True
+        self.requests = []  # request headers, one dict per GET
+
+    @property
+    def body(self):
+        return self._body
+
+    @body.setter
+    def body(self, body):
+        self._body = body
+        self.versions += 1
+
+    @property
+    def modified(self):
+        """Last-Modified of the current body, a minute later for every new one."""
+        return f"Sat, 17 Oct 2026 10:{self.versions:02d}:00 GMT"
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/gtfs"
+
+
+class FeedHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        etag = '"%s"' % hashlib.md5(server.body).hexdigest()
+        if (server.etag and self.headers.get("If-None-Match") == etag) or \
+                (server.last_modified and self.headers.get("If-Modified-Since") == server.modified):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if server.etag:
+            self.send_header("ETag", etag)
+        if server.last_modified:
+            self.send_header("Last-Modified", server.modified)
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+
+@pytest.fixture
+def server():
+    server = FeedServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def feed_bytes(tmp_path, name, **kwargs):
+    path = synthetic_gtfs.write_zip(str(tmp_path / name), n_stops=20, n_routes=2, trips_per_route=3, **kwargs)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def updater(tmp_path, server):
+    (tmp_path / "feed").mkdir()
+    installed = []
+    updater = FeedUpdater(server.url, str(tmp_path / "feed" / "gtfs.zip"), on_update=installed.append, timeout=5)
+    updater.installed = installed
+    return updater
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def part_files(updater):
+    return [f for f in os.listdir(os.path.dirname(updater.zip_path)) if f.endswith(".part")]
+
+
+def test_first_download_installs_feed(tmp_path, server, updater):
+    server.body = feed_bytes(tmp_path, "a.zip")
+
+    assert updater.check() is True
+    assert updater.installed == [updater.zip_path]
+    assert read(updater.zip_path) == server.body
+    # No validators are sent while there is no zip yet
+    assert "If-None-Match" not in server.requests[0]
+    status = updater.status()
+    assert status["etag"] and status["last_modified"] == server.modified and status["last_error"] is None
+    sha256 = hashlib.sha256(server.body).hexdigest()
+    assert gtfs_columnar._current_dir(gtfs_columnar.cache_dir_for(updater.zip_path), sha256) is not None
+
+
+@pytest.mark.parametrize("etag, last_modified", [(True, True), (True, False), (False, True)])
+def test_not_modified(tmp_path, server, updater, etag, last_modified):
+    server.etag, server.last_modified = etag, last_modified
+    server.body = feed_bytes(tmp_path, "a.zip")
+    assert updater.check() is True
+    mtime = os.stat(updater.zip_path).st_mtime_ns
+
+    assert updater.check() is False
+    headers = server.requests[-1]
+    if etag:
+        assert headers["If-None-Match"] == updater.status()["etag"]
+    if last_modified:
+        assert headers["If-Modified-Since"] == server.modified
+    assert updater.installed == [updater.zip_path]
+    assert os.stat(updater.zip_path).st_mtime_ns == mtime
+
+
+def test_same_content_without_validators_is_not_reinstalled(tmp_path, server, updater):
+    server.etag = server.last_modified = False
+    server.body = feed_bytes(tmp_path, "a.zip")
+    assert updater.check() is True
+    mtime = os.stat(updater.zip_path).st_mtime_ns
+
+    assert updater.check() is False
+    assert "If-None-Match" not in server.requests[-1] and "If-Modified-Since" not in server.requests[-1]
+    assert updater.installed == [updater.zip_path]
+    assert os.stat(updater.zip_path).st_mtime_ns == mtime
+    assert part_files(updater) == []
+
+
+def test_new_feed_replaces_old_one(tmp_path, server, updater):
+    server.body = feed_bytes(tmp_path, "a.zip")
+    updater.check()
+    server.body = feed_bytes(tmp_path, "b.zip", seed=1)
+
+    assert updater.check() is True
+    assert updater.installed == [updater.zip_path] * 2
+    assert read(updater.zip_path) == server.body
+    # Only the new feed's columnar build is left
+    sha256 = hashlib.sha256(server.body).hexdigest()
+    assert os.listdir(gtfs_columnar.cache_dir_for(updater.zip_path)) == [gtfs_columnar._version_name(sha256)]
+
+
+def without_trips(data, tmp_path):
+    src, dst = tmp_path / "full.zip", tmp_path / "no-trips.zip"
+    src.write_bytes(data)
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, "w") as zout:
+        for name in zin.namelist():
+            if name != "trips.txt":
+                zout.writestr(name, zin.read(name))
+    return dst.read_bytes()
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data, tmp_path: b"PK\x03\x04 not really a zip",
+    lambda data, tmp_path: data[:len(data) // 2],
+    without_trips,
+], ids=["garbage", "truncated", "missing-table"])
+def test_bad_download_is_rejected(tmp_path, server, updater, corrupt):
+    good = feed_bytes(tmp_path, "a.zip")
+    server.body = good
+    updater.check()
+    server.body = corrupt(feed_bytes(tmp_path, "b.zip", seed=1), tmp_path)
+
+    with pytest.raises(RuntimeError, match="Rejected downloaded feed"):
+        updater.check()
+    assert read(updater.zip_path) == good
+    assert part_files(updater) == []
+    assert updater.installed == [updater.zip_path]
+    assert updater.status()["last_error"].startswith("Rejected downloaded feed")
+
+
+def test_bad_first_download_leaves_no_zip(tmp_path, server, updater):
+    server.body = b"garbage"
+    with pytest.raises(RuntimeError):
+        updater.check()
+    assert not os.path.exists(updater.zip_path)
+    assert part_files(updater) == []
+    assert updater.installed == []
@@ -0,0 +1,57 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import display as dsp
+from benchmarks.bench_packers import legacy_pack_1bpp, legacy_pack_4bpp, make_test_image
+
+SIZES = [(122, 250), (960, 540), (121, 250), (7, 3), (961, 541)]
+
+
+def gray_ramp(width, height):
+    """Every gray level, including the 128/129 threshold of the 1bpp packer."""
+    arr = (np.arange(width * height) % 256).astype(np.uint8).reshape(height, width)
+    return Image.fromarray(arr, mode="L").convert("RGB")
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+@pytest.mark.parametrize("make_image", [make_test_image, gray_ramp])
+def test_pack_1bpp_matches_original_bit_loop(width, height, make_image):
+    image = make_image(width, height)
+    assert dsp.pack_1bpp(image, width, height) == legacy_pack_1bpp(image, width, height)
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+@pytest.mark.parametrize("make_image", [make_test_image, gray_ramp])
+def test_pack_4bpp_matches_original_getpixel_loop(width, height, make_image):
+    image = make_image(width, height)
+    assert dsp.pack_4bpp(image, width, height) == legacy_pack_4bpp(image, width, height)
+
+
+@pytest.mark.parametrize("width, height", [(122, 250), (7, 3)])
+def test_packers_resize_like_the_original(width, height):
+    # Screens are rendered at the screen's size, the packer scales them to the panel
+    image = make_test_image(width * 2 + 1, height + 3, seed=5)
+    assert dsp.pack_1bpp(image, width, height) == legacy_pack_1bpp(image, width, height)
+    assert dsp.pack_4bpp(image, width, height) == legacy_pack_4bpp(image, width, height)
+
+
+@pytest.mark.parametrize("convert, pack", [
+    (dsp.convert_image_to_1bpp_bin, dsp.pack_1bpp),
+    (dsp.convert_image_to_4bpp_bin, dsp.pack_4bpp),
+])
+def test_convert_without_output_path_writes_nothing(convert, pack, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image = make_test_image(121, 250)
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+
+    data = convert(io.BytesIO(png.getvalue()), None, 121, 250)
+    assert data == pack(image, 121, 250)
+    assert list(tmp_path.iterdir()) == []
+
+    out = tmp_path / "frame.bin"
+    assert convert(io.BytesIO(png.getvalue()), str(out), 121, 250) == data
+    assert out.read_bytes() == data
@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import FakeSource
+
+
+class SlowSource(FakeSource):
+    """First fetch waits until every concurrent save has picked its uid."""
+    barrier = None
+
+    def fetch_data(self):
+        self.barrier.wait(5)
+        super().fetch_data()
+
+
+class FailingSource(FakeSource):
+    def fetch_data(self):
+        raise ConnectionError("service unreachable")
+
+
+@pytest.fixture
+def sources(ctl, monkeypatch):
+    monkeypatch.setattr(ctl, "SOURCE_CLASSES", {"Slow": SlowSource, "Failing": FailingSource})
+    return ctl
+
+
+def test_concurrent_saves_get_distinct_uids(sources, monkeypatch):
+    count = 4
+    monkeypatch.setattr(SlowSource, "barrier", threading.Barrier(count))
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        saved = list(pool.map(lambda i: sources.save_datasource({"source": "Slow", "inputs": {"value": i}}),
+                              range(count)))
+
+    uids = [item["uid"] for item in saved]
+    assert sorted(uids) == [1, 2, 3, 4]
+    for i, item in enumerate(saved):
+        assert sources.DATASOURCES.get(item["uid"])["data"] == {"value": i}
+        assert sources.INSTANCE_REGISTRY[item["uid"]].inputs == {"value": i}
+
+
+def test_failed_save_releases_its_uid(sources):
+    with pytest.raises(RuntimeError):
+        sources.save_datasource({"source": "Failing", "inputs": {"value": 1}})
+    assert sources.DATASOURCES.all() == []
+    assert sources.INSTANCE_REGISTRY == {}
+    assert sources.SCHEDULER.next_due(1) is None
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from conftest import FakeSource, make_screen, text_widget, value_widget
+
+
+class BlockingSource(FakeSource):
+    """Fetch waits until the test releases it."""
+    started = None
+    release = None
+
+    def fetch_data(self):
+        self.started.set()
+        assert self.release.wait(5)
+        super().fetch_data()
+
+
+class FailingSource(FakeSource):
+    def fetch_data(self):
+        raise ConnectionError("service unreachable")
+
+
+@pytest.fixture
+def app(ctl, monkeypatch):
+    import main
+    monkeypatch.setattr(ctl, "SOURCE_CLASSES", {
+        "Fake": FakeSource, "Blocking": BlockingSource, "Failing": FailingSource,
+    })
+    return main.app.test_client()
+
+
+def add_source(ctl, uid, source, value=None, persisted=None):
+    ctl.DATASOURCES.put({"uid": uid, "source": source, "inputs": {"value": value}, "data": persisted or {}})
+
+
+def wait_ready(client, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/api/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    raise AssertionError(f"Not ready after {timeout}s: {response.get_json()}")
+
+
+def test_ready_only_once_every_source_settled(app, ctl, monkeypatch):
+    monkeypatch.setattr(ctl, "WARMUP_WORKERS", 1)
+    monkeypatch.setattr(BlockingSource, "started", threading.Event())
+    monkeypatch.setattr(BlockingSource, "release", threading.Event())
+    add_source(ctl, 1, "Blocking", value=10)
+    add_source(ctl, 2, "Blocking", value=20)
+
+    ctl.initialize_instances_from_file(background=True)
+    try:
+        assert BlockingSource.started.wait(5)
+        response = app.get("/api/ready")
+        assert response.status_code == 503
+        body = response.get_json()
+        assert body["ready"] is False
+        # One worker: the first source is fetching, the second still waits for it
+        assert sorted(s["state"] for s in body["sources"].values()) == ["initializing", "pending"]
+    finally:
+        BlockingSource.release.set()
+
+    body = wait_ready(app).get_json()
+    assert body["ready"] is True
+    assert {uid: s["state"] for uid, s in body["sources"].items()} == {"1": "ready", "2": "ready"}
+    assert ctl.DATASOURCES.get(1)["data"] == {"value": 10}
+    assert ctl.DATASOURCES.get(2)["data"] == {"value": 20}
+
+
+def test_failed_first_fetch_keeps_persisted_values_and_retries(app, ctl):
+    add_source(ctl, 1, "Failing", value=10, persisted={"value": 5})
+    add_source(ctl, 2, "No such source", value=1)
+    ctl.SCREENS.put(make_screen(1, [{**value_widget(1), "value": 5}]))
+    ctl.BINDINGS.rebuild(ctl.SCREENS.all())
+
+    before = time.time()
+    ctl.initialize_instances_from_file(background=False)
+
+    states = ctl.get_source_states()
+    assert states["ready"] is True
+    assert states["sources"][1]["state"] == "retrying"
+    assert "service unreachable" in states["sources"][1]["error"]
+    assert states["sources"][2]["state"] == "failed"
+
+    # Devices keep getting the last persisted values
+    assert ctl.DATASOURCES.get(1)["data"] == {"value": 5}
+    assert ctl.SCREENS.get(1)["widgets"][0]["value"] == 5
+
+    # Registered for the refresh loop, which tries again after RETRY_DELAY
+    assert 1 in ctl.INSTANCE_REGISTRY and 2 not in ctl.INSTANCE_REGISTRY
+    due = ctl.SCHEDULER.next_due(1)
+    assert before + ctl.RETRY_DELAY <= due <= time.time() + ctl.RETRY_DELAY
+
+    assert app.get("/api/ready").status_code == 200
+
+
+def test_warm_up_stores_all_values_in_one_batch(app, ctl):
+    for uid in (1, 2, 3):
+        add_source(ctl, uid, "Fake", value=uid * 10, persisted={"value": 0})
+    add_source(ctl, 4, "Failing", value=40, persisted={"value": 4})
+    ctl.SCREENS.put(make_screen(1, [value_widget(1), value_widget(2, y=60)]))
+    ctl.SCREENS.put(make_screen(2, [value_widget(2), value_widget(3, y=60), value_widget(4, y=90)]))
+    ctl.SCREENS.put(make_screen(3, [text_widget("not bound")]))
+    ctl.BINDINGS.rebuild(ctl.SCREENS.all())
+    ctl.DATASOURCES.flush()
+    ctl.SCREENS.flush()
+    source_writes, screen_writes = ctl.DATASOURCES.writes, ctl.SCREENS.writes
+    announced = []
+    ctl.SCREEN_UPDATE_LISTENERS.append(announced.append)
+
+    ctl.initialize_instances_from_file(background=False)
+
+    assert ctl.DATASOURCES.writes - source_writes == 1
+    assert ctl.SCREENS.writes - screen_writes == 1
+    assert len(announced) == 1
+    assert sorted(screen["id"] for screen in announced[0]) == [1, 2]
+    assert [w["value"] for w in ctl.SCREENS.get(2)["widgets"]] == [20, 30, None]
+    assert ctl.DATASOURCES.get(4)["data"] == {"value": 4}
+    states = ctl.get_source_states()["sources"]
+    assert [states[uid]["state"] for uid in (1, 2, 3, 4)] == ["ready", "ready", "ready", "retrying"]